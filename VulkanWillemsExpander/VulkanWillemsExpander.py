@@ -44,14 +44,22 @@
 #
 
 import argparse
+import array
+import bisect
+import hashlib
+import itertools
 import os
+import re
+import sys
 from VulkanWillemsExpander import IOUtil
+from VulkanWillemsExpander import Stats
 
 __g_verbosityLevel = 0
 __g_debugEnabled = False
 __g_allowDevelopmentPlugins = False
 
 MAGIC_TAG = "__exp__"
+STREAM_NAME = "-"
 TAG_SEARCH = "VulkanWillemsExpander"
 SOURCE_TAG = "// Expanded by VulkanWillemsExpander https://github.com/Unarmed1000/VulkanWillemsExpander"
 
@@ -67,12 +75,39 @@ def ShowTitleIfNecessary():
 
 
 class MethodInfo(object):
-    def __init__(self, name, parameterCount, expansionParameters):
+    # Part of the method table cache key, bump it whenever the validation or the RenderTemplate format changes
+    TEMPLATE_VERSION = 1
+
+    def __init__(self, name, parameterCount, expansionParameters, renderTemplate=None):
+        """
+        A renderTemplate is only supplied for methods that were already validated and compiled, like the ones restored from a method table cache.
+        """
         super(MethodInfo, self).__init__()
         self.Name = name
         self.ParameterCount = parameterCount
         self.ExpansionParameters = expansionParameters
-        self.__Validate(expansionParameters, parameterCount)
+        if renderTemplate == None:
+            self.__Validate(expansionParameters, parameterCount)
+            renderTemplate = self.__CompileRenderTemplate(expansionParameters)
+        self.RenderTemplate = renderTemplate
+
+    def __CompileRenderTemplate(self, expansionParameters):
+        """
+        Compile the expansion parameters into a str.format template where {0} is the line prefix and {N+1} is parameter N,
+        so a record can be rendered without parsing the '#N' references again.
+        """
+        lines = []
+        for param in expansionParameters:
+            value = param[1]
+            if value.startswith("#"):
+                value = "{%s}" % (int(value[1:]) + 1)
+            else:
+                value = value.replace("{", "{{").replace("}", "}}")
+            lines.append("{0}.%s = %s;\n" % (param[0], value))
+        return "".join(lines)
+
+    def Render(self, linePrefix, parameters):
+        return self.RenderTemplate.format(linePrefix, *parameters)
     
     def __Validate(self, expansionParameters, parameterCount):
         lookup = set()
@@ -95,8 +130,8 @@ class UseCase:
   Initializer = 0
   FunctionParameter = 1
   ArrayParameter = 2
-  ArrayAssignment = 3,
-  MemberAssignment = 4,
+  ArrayAssignment = 3
+  MemberAssignment = 4
   Unknown = 5
 
 
@@ -107,10 +142,16 @@ def ToUseCaseString(value):
         return "FunctionParameter"
     elif value == UseCase.ArrayParameter:
         return "ArrayParameter"
+    elif value == UseCase.ArrayAssignment:
+        return "ArrayAssignment"
+    elif value == UseCase.MemberAssignment:
+        return "MemberAssignment"
     return "Unknown"
 
 
 class SourceEntry(object):
+    __slots__ = ("StartIndex", "EndIndex", "Name")
+
     def __init__(self, startIndex, endIndex, name):
         super(SourceEntry, self).__init__()
         self.StartIndex = startIndex
@@ -119,6 +160,8 @@ class SourceEntry(object):
 
 
 class InitRecord(SourceEntry):
+    __slots__ = ("Parameters", "UseCase", "MethodInfo")
+
     def __init__(self, startIndex, endIndex, name, parameters):
         super(InitRecord, self).__init__(startIndex, endIndex, name)
         self.Parameters = parameters
@@ -126,78 +169,179 @@ class InitRecord(SourceEntry):
         self.MethodInfo = None
 
 
+class CodePatch(object):
+    __slots__ = ("StartIndex", "EndIndex", "Content")
+
+    def __init__(self, startIndex, endIndex, content):
+        super(CodePatch, self).__init__()
+        self.StartIndex = startIndex
+        self.EndIndex = endIndex
+        self.Content = content
+
+
 class VariableNameRecord(SourceEntry):
+    __slots__ = ()
+
     def __init__(self, startIndex, endIndex, name):
         super(VariableNameRecord, self).__init__(startIndex, endIndex, name)
 
 
 class VariableTypeRecord(SourceEntry):
+    __slots__ = ("Indent",)
+
     def __init__(self, startIndex, endIndex, name, indent):
         super(VariableTypeRecord, self).__init__(startIndex, endIndex, name)
         self.Indent = indent;
 
 
-def FindParametersEnd(source, startIndex):
-    paramStartCount = 0
-    for i in range(startIndex, len(source)):
-        if source[i] == '(':
-            paramStartCount = paramStartCount + 1
-        elif source[i] == ')':
-            paramStartCount = paramStartCount - 1
-            if paramStartCount <= 0:
-                return i
-    return -1
-
-
-def FunctionCallAwareSplit(parameters):
-    splitIndices = []
-    paramStartCount = 0
-    for i in range(0, len(parameters)):
-        if parameters[i] == '(':
+# Comments, string and character literals are matched so they can be skipped as a whole
+g_scanSkipPattern = "|".join([
+    r"//[^\n]*",
+    r"/\*.*?(?:\*/|\Z)",
+    r'"(?:\\.|[^"\\\n])*"',
+    r"'(?:\\.|[^'\\\n])*'",
+])
+g_scanInitializerPattern = re.compile(g_scanSkipPattern + r"|vks::initializers::(\w*)\s*\(", re.DOTALL)
+g_scanParametersPattern = re.compile(g_scanSkipPattern + r"|[(),]", re.DOTALL)
+g_parameterWhitespacePattern = re.compile(r"[\r\n\t]")
+g_scanSkipMatcher = re.compile(g_scanSkipPattern, re.DOTALL)
+g_initializerCallPattern = re.compile(r"vks::initializers::(\w*)\s*\(")
+# With --vectorized-scan sources of at least this size are scanned using a DepthMap when numpy is installed. It's off by
+# default as the benchmark sources are scanned faster by the regex scan, only deeply nested parameters gain from it
+VECTORIZED_SCAN_MIN_SIZE = 256 * 1024
+g_useVectorizedScan = False
+
+
+def BlankCommentsAndLiterals(source):
+    """
+    Replace all comments and literals with spaces, so the offsets still match the source.
+    """
+    return g_scanSkipMatcher.sub(lambda match: " " * (match.end() - match.start()), source)
+
+
+def FindParameterSpans(source, startIndex):
+    """
+    Locate the closing parenthesis of the call whose parameters begin at startIndex and the spans of its top level parameters.
+    Returns a (endIndex, spans) tuple or None if the call is never closed.
+    """
+    search = g_scanParametersPattern.search
+    spans = []
+    paramStartCount = 1
+    paramStartIndex = startIndex
+    index = startIndex
+    while True:
+        match = search(source, index)
+        if match is None:
+            return None
+        index = match.end()
+        token = match.group()
+        if token == '(':
             paramStartCount = paramStartCount + 1
-        elif parameters[i] == ')':
+        elif token == ')':
             paramStartCount = paramStartCount - 1
-        elif parameters[i] == ',' and paramStartCount == 0:
-            splitIndices.append(i)
-    splitIndices.append(len(parameters))
-
-    res = []
-    prevIndex = 0
-    for index in splitIndices:
-        res.append(parameters[prevIndex:index].strip())
-        prevIndex = index+1
-    return res
-
+            if paramStartCount == 0:
+                spans.append((paramStartIndex, match.start()))
+                return (match.start(), spans)
+        elif token == ',' and paramStartCount == 1:
+            spans.append((paramStartIndex, match.start()))
+            paramStartIndex = index
 
 
-def ExtractParameters(parameters):
-    parameters = parameters.replace("\n", "")
-    parameters = parameters.replace("\r", "")
-    parameters = parameters.replace("\t", "")
-    parameters = FunctionCallAwareSplit(parameters)
+def ExtractParameters(source, spans):
+    parameters = [g_parameterWhitespacePattern.sub("", source[start:end]).strip() for start, end in spans]
     if len(parameters) == 1 and len(parameters[0]) == 0:
         return []
     return parameters
 
 
-def FindNextInitializer(source, startIndex):
-    searchString = "vks::initializers::"
-    newIndex = source.find(searchString, startIndex)
-    if newIndex < 0:
-        return None
-
-    indexParamsBegin = source.find("(", newIndex)
-    if indexParamsBegin < 0:
-        return None
-
-    indexParamsEnd = FindParametersEnd(source, indexParamsBegin)
-    if indexParamsEnd < 0:
-        return None
-
-    methodName = source[newIndex+len(searchString):indexParamsBegin]
-    parameters = source[indexParamsBegin+1:indexParamsEnd]
-    parameters = ExtractParameters(parameters)
-    return InitRecord(newIndex, indexParamsEnd+1, methodName, parameters)
+def CountParameters(source, spans):
+    """
+    The length of ExtractParameters(source, spans) without extracting them.
+    """
+    if len(spans) == 1:
+        start, end = spans[0]
+        return 0 if len(source[start:end].strip()) == 0 else 1
+    return len(spans)
+
+
+def ScanInitializersVectorized(source, code):
+    """
+    ScanInitializers for large sources, the calls are located in the code (the source with comments and literals blanked
+    out) and the parameters of all of them are found with a DepthMap.
+    """
+    from VulkanWillemsExpander import DepthMap
+    # A call split by a comment only matches in the blanked code
+    matches = [match for match in g_initializerCallPattern.finditer(code) if g_initializerCallPattern.match(source, match.start())]
+    if len(matches) == 0:
+        return
+    calls = DepthMap.DepthMap(code).FindCalls([match.end() - 1 for match in matches])
+    index = 0
+    for match, call in zip(matches, calls):
+        if match.start() < index:
+            # nested inside the parameters of the previous call
+            continue
+        if call is None:
+            return
+        closeIndex, spans = call
+        yield (match.start(), closeIndex+1, match.group(1), spans)
+        index = closeIndex+1
+
+
+def ScanInitializers(source, sourceIndex=None):
+    """
+    Scan the source in one linear pass and yield a (startIndex, endIndex, name, spans) tuple for each top level initializer call.
+    Calls inside comments and string literals are ignored and so are initializer calls nested inside the parameters of another.
+    Large sources are scanned by ScanInitializersVectorized if it's enabled and numpy is installed, a SourceIndex of the
+    source can be supplied so it can reuse the blanked code.
+    """
+    if g_useVectorizedScan and len(source) >= VECTORIZED_SCAN_MIN_SIZE:
+        from VulkanWillemsExpander import DepthMap
+        if DepthMap.IsSupported():
+            code = sourceIndex.GetCode() if sourceIndex != None else BlankCommentsAndLiterals(source)
+            for call in ScanInitializersVectorized(source, code):
+                yield call
+            return
+
+    search = g_scanInitializerPattern.search
+    index = 0
+    while True:
+        match = search(source, index)
+        if match is None:
+            return
+        index = match.end()
+        if match.lastindex is None:
+            continue
+        res = FindParameterSpans(source, index)
+        if res is None:
+            return
+        indexParamsEnd, spans = res
+        yield (match.start(), indexParamsEnd+1, match.group(1), spans)
+        index = indexParamsEnd+1
+
+
+def FindInitializers(source, sourceIndex=None):
+    """
+    Returns a InitRecord for each top level initializer call found by ScanInitializers.
+    """
+    return [InitRecord(startIndex, endIndex, name, ExtractParameters(source, spans)) for startIndex, endIndex, name, spans in ScanInitializers(source, sourceIndex)]
+
+
+def FindInitializerTable(source, sourceIndex=None, ignoreMethods=None):
+    """
+    Scan the source into a RecordTable with the use case of each call, calls of the ignored methods are left out.
+    The table only references the source, so it's much smaller than the InitRecords when only the locations are needed.
+    """
+    from VulkanWillemsExpander import RecordTable
+    if sourceIndex == None:
+        sourceIndex = SourceIndex(source)
+    if ignoreMethods == None:
+        ignoreMethods = g_ignoreMethods
+    table = RecordTable.RecordTable()
+    classifier = UseCaseClassifier(sourceIndex)
+    for startIndex, endIndex, name, spans in ScanInitializers(source, sourceIndex):
+        if not name in ignoreMethods:
+            table.Append(startIndex, endIndex, name, spans, CountParameters(source, spans), classifier.Classify(startIndex))
+    return table
 
 
 #
@@ -599,6 +743,33 @@ g_ignoreMethods = {
 }
 
 
+# The lookup dict of the active method tables, it's build on first use by GetCodeReplacementDict
+g_codeReplacementDict = None
+# The method table file the active method tables were loaded from, None for the built in tables
+g_methodTableFileName = None
+
+
+def UseMethodTable(fileName):
+    """
+    Replace the built in method tables with the ones defined in the method table file.
+    """
+    global g_allMethods
+    global g_ignoreMethods
+    global g_codeReplacementDict
+    global g_methodTableFileName
+    from VulkanWillemsExpander import MethodTable
+    g_allMethods, g_ignoreMethods = MethodTable.Load(fileName, MethodInfo, MethodInfo.TEMPLATE_VERSION)
+    g_codeReplacementDict = None
+    g_methodTableFileName = fileName
+
+
+def GetCodeReplacementDict():
+    global g_codeReplacementDict
+    if g_codeReplacementDict == None:
+        g_codeReplacementDict = BuildCodeReplacementDict()
+    return g_codeReplacementDict
+
+
 def BuildCodeReplacementDict():
     dict = {}
     for entry in g_allMethods:
@@ -616,6 +787,17 @@ def BuildCodeReplacementDict():
     return dict
 
 
+def GetMethodFingerprint():
+    """
+    Calculate a fingerprint of the method tables, files expanded with different tables will produce different results.
+    """
+    hash = hashlib.sha1(GetTitle().encode("utf-8"))
+    for entry in g_allMethods:
+        hash.update(repr((entry.Name, entry.ParameterCount, entry.ExpansionParameters)).encode("utf-8"))
+    hash.update(repr(sorted(g_ignoreMethods)).encode("utf-8"))
+    return hash.hexdigest()
+
+
 def FindReplacementMethodInfo(record, replacementDict):
     if not record.Name in replacementDict:
         return None
@@ -625,48 +807,97 @@ def FindReplacementMethodInfo(record, replacementDict):
     return dictParams[len(record.Parameters)]
 
 
-def LastIndexOfNonWhitepace(source, startIndex):
-    for i in reversed(range(0, startIndex)):
-        if source[i] != ' ' and source[i] != '\t' and source[i] != '\r' and source[i] != '\n':
-            return i
+g_lineBreakPattern = re.compile(r"[\r\n]")
+g_nonWhitespacePattern = re.compile(r"[^ \t\r\n]")
+WHITESPACE_CHARACTERS = " \t\r\n"
+# The number of characters examined at a time when searching backwards for non whitespace
+SCAN_WINDOW_SIZE = 64
+
+
+class SourceIndex(object):
+    """
+    Index of the line start offsets of a source, it's build once per source so the line containing a offset can be
+    found with a binary search instead of scanning the source one character at a time.
+    """
+    def __init__(self, source):
+        super(SourceIndex, self).__init__()
+        self.Source = source
+        self.LineStarts = [0] + [match.end() for match in g_lineBreakPattern.finditer(source)]
+        # The offset of the first non whitespace character at or after each line start, filled in on first use
+        self.IndentEnds = {}
+        self.Code = None
+
+    def GetLine(self, index):
+        """
+        Get the line that contains the offset, a offset just after a line break belongs to the next line.
+        """
+        return bisect.bisect_right(self.LineStarts, index) - 1
+
+    def GetCode(self):
+        """
+        Get the source with all comments and literals replaced by spaces, so the offsets still match the source.
+        """
+        if self.Code == None:
+            self.Code = BlankCommentsAndLiterals(self.Source)
+        return self.Code
+
+    def GetIndentEnd(self, line):
+        indentEnd = self.IndentEnds.get(line)
+        if indentEnd == None:
+            indentEnd = IndexOfNonWhitepace(self, self.LineStarts[line])
+            self.IndentEnds[line] = indentEnd
+        return indentEnd
+
+
+def LastIndexOfNonWhitepace(sourceIndex, startIndex):
+    source = sourceIndex.Source
+    endIndex = startIndex
+    while endIndex > 0:
+        windowStart = max(0, endIndex - SCAN_WINDOW_SIZE)
+        length = len(source[windowStart:endIndex].rstrip(WHITESPACE_CHARACTERS))
+        if length > 0:
+            return windowStart + length - 1
+        endIndex = windowStart
     return -1
 
-def IndexOfNonWhitepace(source, startIndex):
-    for i in range(startIndex, len(source)):
-        if source[i] != ' ' and source[i] != '\t' and source[i] != '\r' and source[i] != '\n':
-            return i
-    return -1
 
+def IndexOfNonWhitepace(sourceIndex, startIndex):
+    match = g_nonWhitespacePattern.search(sourceIndex.Source, startIndex)
+    return match.start() if match else -1
 
-def LastIndexOfWhitepace(source, startIndex):
-    for i in reversed(range(0, startIndex)):
-        if source[i] == ' ' or source[i] == '\t' or source[i] == '\r' or source[i] == '\n':
-            return i
-    return -1
 
+def LastIndexOfWhitepace(sourceIndex, startIndex):
+    if startIndex <= 0:
+        return -1
+    source = sourceIndex.Source
+    if source[startIndex - 1] == '\r' or source[startIndex - 1] == '\n':
+        return startIndex - 1
+    # The character before a line start is always a line break, so only the current line needs to be searched
+    lineStart = sourceIndex.LineStarts[sourceIndex.GetLine(startIndex - 1)]
+    index = source.rfind(' ', lineStart, startIndex)
+    index = max(index, source.rfind('\t', max(index + 1, lineStart), startIndex))
+    return index if index >= 0 else lineStart - 1
 
-def DetermineIndentString(source, startIndex):
-    index = 0
-    for i in reversed(range(0, startIndex)):
-        if source[i] == '\r' or source[i] == '\n':
-            index = i+1
-            break
-    endIndex = IndexOfNonWhitepace(source, index)
+
+def DetermineIndentString(sourceIndex, startIndex):
+    line = sourceIndex.GetLine(startIndex)
+    endIndex = sourceIndex.GetIndentEnd(line)
     if endIndex < 0:
         raise Exception("Not found");
-    return source[index:endIndex];
+    return sourceIndex.Source[sourceIndex.LineStarts[line]:endIndex];
 
 
 
-def LocateAssignmentVariableName(source, index):
+def LocateAssignmentVariableName(sourceIndex, index):
+    source = sourceIndex.Source
     index = source.rfind('=', 0, index)
     if index < 0:
         raise Exception("Not a assignment");
-    endIndex = LastIndexOfNonWhitepace(source, index-1)
+    endIndex = LastIndexOfNonWhitepace(sourceIndex, index-1)
     if endIndex < 0:
         raise Exception("Not a assignment");
     endIndex = endIndex + 1
-    startIndex = LastIndexOfWhitepace(source, endIndex)
+    startIndex = LastIndexOfWhitepace(sourceIndex, endIndex)
     if startIndex < 0:
         raise Exception("Not a assignment");
     startIndex = startIndex + 1
@@ -674,28 +905,20 @@ def LocateAssignmentVariableName(source, index):
     return VariableNameRecord(startIndex, endIndex, name)
 
 
-def LocateAssignmentVariableType(source, index):
-    endIndex = LastIndexOfNonWhitepace(source, index-1)
+def LocateAssignmentVariableType(sourceIndex, index):
+    endIndex = LastIndexOfNonWhitepace(sourceIndex, index-1)
     if endIndex < 0:
         raise Exception("type not found");
     endIndex = endIndex + 1
-    startIndex = LastIndexOfWhitepace(source, endIndex)
+    startIndex = LastIndexOfWhitepace(sourceIndex, endIndex)
     if startIndex < 0:
         raise Exception("type not found");
     startIndex = startIndex + 1
-    name = source[startIndex:endIndex]
-    indent = DetermineIndentString(source, startIndex);
+    name = sourceIndex.Source[startIndex:endIndex]
+    indent = DetermineIndentString(sourceIndex, startIndex);
     return VariableTypeRecord(startIndex, endIndex, name, indent)
 
 
-def LookupParameter(formatString, parameters):
-    if not formatString.startswith("#"):
-        return formatString;
-    formatString = formatString[1:]
-    index = int(formatString)
-    return parameters[index]
-
-
 def IsAssignmentUseCase(useCase):
     return useCase == UseCase.ArrayAssignment or useCase == UseCase.MemberAssignment or useCase == UseCase.Initializer
 
@@ -712,66 +935,77 @@ def DetermineAlternativeEndIndex(source, record, index):
     return index
 
 
-def PatchCodeComment(source, record):
-    strIndent = DetermineIndentString(source, record.StartIndex)
+def PatchCodeComment(sourceIndex, record):
+    strIndent = DetermineIndentString(sourceIndex, record.StartIndex)
     
-    strTo = "\n%s// Lookup of initializer '%s'\n" % (strIndent, record.Name)
+    linePrefix = strIndent + "// "
+    res = ["\n%s// Lookup of initializer '%s'\n" % (strIndent, record.Name)]
     if not type(record.MethodInfo) is type([]):
-        for entry in record.MethodInfo.ExpansionParameters:
-            strTo += "%s// .%s = %s;\n" % (strIndent, entry[0], LookupParameter(entry[1], record.Parameters))
+        res.append(record.MethodInfo.Render(linePrefix, record.Parameters))
     else:
         for index, methodInfo in enumerate(record.MethodInfo):
-            strTo += "%s// Possibility #%s\n" % (strIndent, index)
-            for entry in methodInfo.ExpansionParameters:
-                strTo += "%s// .%s = %s;\n" % (strIndent,entry[0], LookupParameter(entry[1], record.Parameters))
+            res.append("%s// Possibility #%s\n" % (strIndent, index))
+            res.append(methodInfo.Render(linePrefix, record.Parameters))
     if not IsAssignmentUseCase(record.UseCase):
-        strTo += strIndent
+        res.append(strIndent)
 
-    alternativeIndex = DetermineAlternativeEndIndex(source, record, record.EndIndex)
-    sourceBefore = source[:alternativeIndex]
-    sourceAfter = source[alternativeIndex:]
-    return sourceBefore + strTo + sourceAfter
+    alternativeIndex = DetermineAlternativeEndIndex(sourceIndex.Source, record, record.EndIndex)
+    return CodePatch(alternativeIndex, alternativeIndex, "".join(res))
 
 
-def PatchCodeInitializer(source, record):
-    variableNameRecord = LocateAssignmentVariableName(source, record.StartIndex)
-    variableTypeRecord = LocateAssignmentVariableType(source, variableNameRecord.StartIndex)
+def PatchCodeInitializer(sourceIndex, record):
+    variableNameRecord = LocateAssignmentVariableName(sourceIndex, record.StartIndex)
+    variableTypeRecord = LocateAssignmentVariableType(sourceIndex, variableNameRecord.StartIndex)
 
     indent = variableTypeRecord.Indent
 
-    strTo = "%s %s{};\n" % (variableTypeRecord.Name, variableNameRecord.Name)
-    if not type(record.MethodInfo) is type([]):
-        for entry in record.MethodInfo.ExpansionParameters:
-            strTo += "%s%s.%s = %s;\n" % (indent, variableNameRecord.Name, entry[0], LookupParameter(entry[1], record.Parameters))
-    else:
-        return PatchCodeComment(source, record)
+    if type(record.MethodInfo) is type([]):
+        return PatchCodeComment(sourceIndex, record)
+    strTo = "%s %s{};\n%s" % (variableTypeRecord.Name, variableNameRecord.Name, record.MethodInfo.Render(indent + variableNameRecord.Name, record.Parameters))
 
 #    strFrom = source[variableTypeRecord.StartIndex:record.EndIndex]
 #    print("%s\n%s\n\n" % (strFrom, strTo))
-    endIndex = DetermineAlternativeEndIndex(source, record, record.EndIndex)
-    sourceBefore = source[:variableTypeRecord.StartIndex]
-    sourceAfter = source[endIndex:]
-    return sourceBefore + strTo + sourceAfter
+    endIndex = DetermineAlternativeEndIndex(sourceIndex.Source, record, record.EndIndex)
+    return CodePatch(variableTypeRecord.StartIndex, endIndex, strTo)
 
 
-def PatchCode(source, record):
+def PatchCode(sourceIndex, record):
     if not record.MethodInfo:
-        return source
+        return None
 
     if record.UseCase == UseCase.Initializer:
-        return PatchCodeInitializer(source, record)
+        return PatchCodeInitializer(sourceIndex, record)
     else:
-        return PatchCodeComment(source, record)
-    return source
+        return PatchCodeComment(sourceIndex, record)
+    return None
 
 
-def DetermineAssignmentType(source, record, previousIndex, index):
-    foundIndex = LastIndexOfNonWhitepace(source, index)
+def ApplyPatches(source, patches, warnings):
+    """
+    Assemble the patched source in a single pass.
+    The patches must reference the unmodified source and are applied in order of their start index.
+    """
+    res = []
+    currentIndex = 0
+    for patch in sorted(patches, key=lambda patch: patch.StartIndex):
+        if patch.StartIndex < currentIndex:
+            warnings.append("WARNING: Skipping overlapping patch at index %s" % patch.StartIndex)
+            continue
+        res.append(source[currentIndex:patch.StartIndex])
+        res.append(patch.Content)
+        currentIndex = patch.EndIndex
+    res.append(source[currentIndex:])
+    return "".join(res)
+
+
+def DetermineAssignmentType(sourceIndex, index):
+    source = sourceIndex.Source
+    foundIndex = LastIndexOfNonWhitepace(sourceIndex, index)
     if foundIndex < 0:
         raise Exception("hmm");
     if source[foundIndex] == ']':
         return UseCase.ArrayAssignment
-    firstWhiteSpaceIndex = LastIndexOfWhitepace(source, foundIndex)
+    firstWhiteSpaceIndex = LastIndexOfWhitepace(sourceIndex, foundIndex)
     if firstWhiteSpaceIndex < 0:
         raise Exception("hmm");
     left = source[firstWhiteSpaceIndex+1:foundIndex+1]
@@ -779,7 +1013,7 @@ def DetermineAssignmentType(source, record, previousIndex, index):
         return UseCase.MemberAssignment
 
     # try to determine if we have a 
-    typeStartIndex = LastIndexOfNonWhitepace(source, firstWhiteSpaceIndex-1)
+    typeStartIndex = LastIndexOfNonWhitepace(sourceIndex, firstWhiteSpaceIndex-1)
     if typeStartIndex < 0:
         raise Exception("type not found");
 
@@ -788,56 +1022,219 @@ def DetermineAssignmentType(source, record, previousIndex, index):
     return UseCase.Initializer
 
 
-def DetermineUseCase(source, record, previousIndex, previousUseCase):
-    # This entire method might be too simplistic
-    for i in reversed(range(previousIndex, record.StartIndex)):
-        if source[i] == '(':
+g_classifyTokenPattern = re.compile(r"[(){}\[\];=]")
+# 1 for opening brackets, 2 for closing brackets, 3 for ';' and 4 for '='
+g_classifyTokenKinds = {'(': 1, '{': 1, '[': 1, ')': 2, '}': 2, ']': 2, ';': 3, '=': 4}
+g_blockPrefixPattern = re.compile(r"(?:\b(?:else|do|try|const|override|final|noexcept|mutable)|:)$|\b(?:class|struct|union|enum|namespace)\b")
+
+
+def IsInitializerListBrace(code, previousMatch, braceIndex):
+    """
+    Check if the '{' at braceIndex opens a initializer list rather than a block by looking at the code in front of it,
+    previousMatch is the classify token in front of the brace.
+    """
+    previousToken = previousMatch.group() if previousMatch else ';'
+    previousTokenEnd = previousMatch.end() if previousMatch else 0
+    prefix = code[previousTokenEnd:braceIndex].strip()
+    if len(prefix) == 0:
+        return not (previousToken == ')' or previousToken == ';' or previousToken == '{' or previousToken == '}')
+    return g_blockPrefixPattern.search(prefix) == None
+
+
+class UseCaseClassifier(object):
+    """
+    Classifies calls by the innermost scope they are in: the last assignment or ';' of the current statement or else the
+    unmatched bracket that opened the scope. The code is walked forward once while keeping a stack of the open scopes, so
+    the calls must be classified in order of their start index.
+    """
+    def __init__(self, sourceIndex):
+        super(UseCaseClassifier, self).__init__()
+        self.SourceIndex = sourceIndex
+        self.Code = sourceIndex.GetCode()
+        self.Tokens = g_classifyTokenPattern.finditer(self.Code)
+        self.NextMatch = next(self.Tokens, None)
+        self.PreviousMatch = None
+        # Each scope is a [openIndex, previousMatch, lastIndex, useCase] list, the outermost scope has no opening bracket.
+        # lastIndex is the last ';', assignment or unmatched closing bracket in the scope and useCase caches the result
+        self.Scopes = [[-1, None, -1, None]]
+
+    def Classify(self, startIndex):
+        if self.NextMatch != None and self.NextMatch.start() < startIndex:
+            self.Advance(startIndex)
+        scope = self.Scopes[-1]
+        if scope[3] == None:
+            scope[3] = self.ClassifyScope(scope)
+        return scope[3]
+
+    def Advance(self, startIndex):
+        """
+        Walk the tokens in front of startIndex.
+        """
+        code = self.Code
+        scopes = self.Scopes
+        tokenKinds = g_classifyTokenKinds
+        previousMatch = self.PreviousMatch
+        nextMatch = None
+        for match in itertools.chain((self.NextMatch,), self.Tokens):
+            index = match.start()
+            if index >= startIndex:
+                nextMatch = match
+                break
+            kind = tokenKinds[match.group()]
+            if kind == 1:
+                scopes.append([index, previousMatch, -1, None])
+            elif kind == 2:
+                if len(scopes) > 1:
+                    scopes.pop()
+                else:
+                    # Nothing in front of a unmatched closing bracket belongs to the current statement
+                    scopes[0][2] = index
+                    scopes[0][3] = None
+            elif kind == 3 or not ((index > 0 and code[index-1] in "=!<>") or code[index+1:index+2] == '='):
+                # a ';' or a assignment, comparisons are skipped
+                scope = scopes[-1]
+                scope[2] = index
+                scope[3] = None
+            previousMatch = match
+        self.NextMatch = nextMatch
+        self.PreviousMatch = previousMatch
+
+    def ClassifyScope(self, scope):
+        openIndex, previousMatch, lastIndex = scope[:3]
+        if lastIndex >= 0:
+            if self.Code[lastIndex] == '=':
+                return DetermineAssignmentType(self.SourceIndex, lastIndex - 1)
+            return UseCase.Unknown
+        if openIndex < 0:
+            return UseCase.Unknown
+        token = self.Code[openIndex]
+        if token == '(':
             return UseCase.FunctionParameter
-        elif source[i] == '{':
+        if token == '{' and IsInitializerListBrace(self.Code, previousMatch, openIndex):
             return UseCase.ArrayParameter
-        elif source[i] == '=':
-            return DetermineAssignmentType(source, record, previousIndex, i-1)
-    if previousUseCase == UseCase.ArrayParameter:
-        return UseCase.ArrayParameter
-    return UseCase.Unknown
-
-
-def ProcesssSourceFile(sourceFileName, targetFileName):
-    sourceFile = IOUtil.ReadFile(sourceFileName);
+        return UseCase.Unknown
+
+
+def ClassifyUseCases(sourceIndex, records):
+    """
+    Set the use case of the records, they must be in order of their start index.
+    """
+    classifier = UseCaseClassifier(sourceIndex)
+    for record in records:
+        record.UseCase = classifier.Classify(record.StartIndex)
+
+
+class ExpandStatus:
+    Expanded = 0
+    NothingToExpand = 1
+    AlreadyExpanded = 2
+
+
+class ProcessResult(object):
+    def __init__(self, sourceFileName):
+        super(ProcessResult, self).__init__()
+        self.SourceFileName = sourceFileName
+        self.TargetFileName = None
+        self.Processed = False
+        self.Unchanged = False
+        self.Status = None
+        self.Written = False
+        self.ContentHash = None
+        self.Warnings = []
+        self.Error = None
+        self.Traceback = None
+        self.Stats = None
+        # Only set by the analyze mode
+        self.Table = None
+        self.LineNumbers = None
+
+
+def ExpandSource(sourceFile, replacementDict, warnings, stats=Stats.g_nullStats):
+    """
+    Expand the initializers in the source.
+    Returns a (status, source) tuple, the source is None unless the status is ExpandStatus.Expanded.
+    """
     if TAG_SEARCH in sourceFile:
-        return
+        return (ExpandStatus.AlreadyExpanded, None)
 
-    allEntries = []
-    record = FindNextInitializer(sourceFile, 0)
-    while record != None:
-        if not record.Name in g_ignoreMethods:
-            allEntries.append(record)
-        record = FindNextInitializer(sourceFile, record.EndIndex)
+    clock = stats.Clock()
+    sourceIndex = SourceIndex(sourceFile)
+    allEntries = [record for record in FindInitializers(sourceFile, sourceIndex) if not record.Name in g_ignoreMethods]
+    clock = stats.AddStage("scan", clock, 1, len(sourceFile))
+    if len(allEntries) == 0:
+        return (ExpandStatus.NothingToExpand, None)
 
-    previousIndex = 0
-    previousUseCase = UseCase.Unknown
-    for record in allEntries:
-        useCase = DetermineUseCase(sourceFile, record, previousIndex, previousUseCase)
-        record.UseCase = useCase
-        previousIndex = record.EndIndex
-        previousUseCase = useCase
-
-    replacementDict = BuildCodeReplacementDict()
+    matchCount = 0
     for record in allEntries:
         record.MethodInfo = FindReplacementMethodInfo(record, replacementDict)
-        if not record.MethodInfo:
-            print("WARNING: No match %s" % record.Name)
+        if record.MethodInfo:
+            matchCount = matchCount + 1
+        else:
+            warnings.append("WARNING: No match %s" % record.Name)
+    clock = stats.AddStage("lookup", clock)
+    stats.AddRecords(len(allEntries), len(allEntries) - matchCount)
+    if matchCount == 0:
+        return (ExpandStatus.NothingToExpand, None)
+
+    ClassifyUseCases(sourceIndex, allEntries)
+    clock = stats.AddStage("useCase", clock)
 
-    source = sourceFile
-    for record in reversed(allEntries):
-        source = PatchCode(source, record)
+    patches = []
+    for record in allEntries:
+        patch = PatchCode(sourceIndex, record)
+        if patch:
+            patches.append(patch)
+    source = ApplyPatches(sourceFile, patches, warnings)
     source += "\n%s\n" % SOURCE_TAG
-    IOUtil.WriteFileIfChanged(targetFileName, source);
+    stats.AddStage("patch", clock, 1, len(source))
+    return (ExpandStatus.Expanded, source)
 
     #for record in allEntries:
     #    print("Method name '%s' params '%s', useCase %s" % (record.Name, record.Parameters, ToUseCaseString(useCase)))
 
 
+def ExpandSourceFile(sourceFileName, targetFileName, replacementDict, sourceFile, stats=Stats.g_nullStats):
+    """
+    The expansion part of ProcesssSourceFile.
+    Returns a (ProcessResult, source) tuple, the source is None unless there is something to write.
+    """
+    result = ProcessResult(sourceFileName)
+    result.TargetFileName = targetFileName
+    result.Processed = True
+    result.Status, source = ExpandSource(sourceFile, replacementDict, result.Warnings, stats)
+    return (result, source)
+
+
+def WriteTargetFile(result, sourceFile, source, stats=Stats.g_nullStats):
+    """
+    The write part of ProcesssSourceFile, sourceFile is the content of the source file or None if it's no longer in memory.
+    """
+    clock = stats.Clock()
+    if sourceFile != None and os.path.abspath(result.TargetFileName) == os.path.abspath(result.SourceFileName):
+        # We already have the existing content of the target in memory
+        if source != sourceFile:
+            IOUtil.WriteFileAtomic(result.TargetFileName, source)
+            result.Written = True
+    else:
+        result.Written = IOUtil.WriteFileIfChanged(result.TargetFileName, source);
+    stats.AddStage("write", clock, 1, len(source) if result.Written else 0)
+    stats.AddWrite(result.Written)
+
+
+def ProcesssSourceFile(sourceFileName, targetFileName, replacementDict, sourceFile=None, stats=Stats.g_nullStats):
+    """
+    Expand the source file into the target file, if the content of the source file has already been read it can be supplied.
+    Files without anything to expand are left alone, so no target is written and no tag is added.
+    Returns a ProcessResult.
+    """
+    if sourceFile == None:
+        sourceFile = IOUtil.ReadFile(sourceFileName);
+    result, source = ExpandSourceFile(sourceFileName, targetFileName, replacementDict, sourceFile, stats)
+    if source != None:
+        WriteTargetFile(result, sourceFile, source, stats)
+    return result
+
+
 def AddDefaultOptions(parser):
     parser.add_argument('-v', '--verbosity', action='count', default=0, help='Set verbosity level')
     parser.add_argument('--debug', action='store_true',  help='Enable script debugging')
@@ -858,53 +1255,605 @@ def EarlyArgumentParser():
         __g_debugEnabled = True if args.debug else False;
         __g_allowDevelopmentPlugins = True if args.dev else False;
     except (Exception) as ex:
-        print("ERROR: %s" % ex.message)
+        print("ERROR: %s" % ex)
         if __g_debugEnabled:
             raise
         else:
             return False
     return True
 
-def ProcessFile(sourceFileName, targetFileName, overwrite):
+def GetTargetFileName(sourceFileName, overwrite):
+    if overwrite:
+        return sourceFileName
+    dir = IOUtil.GetDirectoryName(sourceFileName)
+    file = IOUtil.GetFileNameWithoutExtension(sourceFileName)
+    ext = IOUtil.GetFileNameExtension(sourceFileName)
+    return IOUtil.Join(dir, "%s%s%s" % (file, MAGIC_TAG, ext))
+
+
+def ProcessFile(sourceFileName, targetFileName, overwrite, replacementDict, sourceContent=None, stats=Stats.g_nullStats):
     if not targetFileName:
-        dir = IOUtil.GetDirectoryName(sourceFileName)
-        file = IOUtil.GetFileNameWithoutExtension(sourceFileName)
-        ext = IOUtil.GetFileNameExtension(sourceFileName)
-        targetFileName = IOUtil.Join(dir, "%s%s%s" % (file, MAGIC_TAG, ext)) if not overwrite else sourceFileName
-    ProcesssSourceFile(sourceFileName, targetFileName)
+        targetFileName = GetTargetFileName(sourceFileName, overwrite)
+    return ProcesssSourceFile(sourceFileName, targetFileName, replacementDict, sourceContent, stats)
+
+
+def ProcessStream(sourceFileName, targetFileName, replacementDict, stats=Stats.g_nullStats, fsync=False):
+    """
+    Filter mode, a source named STREAM_NAME is read from stdin and a target named STREAM_NAME or no target at all writes to stdout.
+    The source is passed through unmodified if there is nothing to expand and warnings are written to stderr.
+    """
+    sourceFile = sys.stdin.read() if sourceFileName == STREAM_NAME else IOUtil.ReadFile(sourceFileName)
+    warnings = []
+    status, source = ExpandSource(sourceFile, replacementDict, warnings, stats)
+    for warning in warnings:
+        sys.stderr.write("%s\n" % warning)
+    if status != ExpandStatus.Expanded:
+        source = sourceFile
+    if not targetFileName or targetFileName == STREAM_NAME:
+        sys.stdout.write(source)
+        sys.stdout.flush()
+    elif IOUtil.WriteFileIfChanged(targetFileName, source) and fsync:
+        IOUtil.SyncFiles([targetFileName])
+
+
+def HandleDaemonRequest(request, replacementDict):
+    """
+    Handle one request received by the daemon, 'expand' expands the supplied source while 'expandFile' processes a file
+    exactly like ProcessFile.
+    """
+    command = request.get("command")
+    if command == "expand":
+        warnings = []
+        status, source = ExpandSource(request["source"], replacementDict, warnings)
+        if status != ExpandStatus.Expanded:
+            source = request["source"]
+        return {"status": status, "source": source, "warnings": warnings}
+    elif command == "expandFile":
+        result = ProcessFile(request["file"], request.get("target"), request.get("overwrite", False), replacementDict)
+        return {"status": result.Status, "written": result.Written, "warnings": result.Warnings}
+    elif command == "ping" or command == "shutdown":
+        return {"title": GetTitle()}
+    raise Exception("Unknown command '%s'" % (command))
+
+
+def RunDaemon(socketPath):
+    """
+    Keep the method tables warm and serve expansion requests on a local unix socket until asked to shut down.
+    """
+    global __g_verbosityLevel
+    from VulkanWillemsExpander import Daemon
+    replacementDict = GetCodeReplacementDict()
+    if __g_verbosityLevel > 0:
+        print("Listening on '%s'" % (socketPath))
+    Daemon.Serve(socketPath, lambda request: HandleDaemonRequest(request, replacementDict))
+
+
+def TryReadTargetFile(file, all):
+    """
+    Read the file if it's a target, files without 'public VulkanExampleBase' (unless all is set), without any initializer
+    call or that already contain the TAG_SEARCH are rejected without being read or decoded.
+    Returns the binary content or None.
+    """
+    requiredTokens = [b"vks::initializers::"] if all else [b"public VulkanExampleBase", b"vks::initializers::"]
+    return IOUtil.ReadBinaryFileIfMatching(file, requiredTokens, [TAG_SEARCH.encode("utf-8")])
+
+
+class FileJob(object):
+    def __init__(self, sourceFileName, overwrite, all, hashContent, knownContentHash, collectStats):
+        super(FileJob, self).__init__()
+        self.SourceFileName = sourceFileName
+        self.Overwrite = overwrite
+        self.All = all
+        self.HashContent = hashContent
+        self.KnownContentHash = knownContentHash
+        self.CollectStats = collectStats
+
+
+def InitializeWorker(methodTableFileName, useVectorizedScan):
+    global g_useVectorizedScan
+    g_useVectorizedScan = useVectorizedScan
+    # Workers that were not forked from the main process start out with the built in method tables
+    if methodTableFileName != g_methodTableFileName:
+        UseMethodTable(methodTableFileName)
+    GetCodeReplacementDict()
+
+
+def AnalyzeSource(source, stats=Stats.g_nullStats):
+    """
+    Run only the scan and classification stages on the source.
+    Returns a (RecordTable, lineNumbers) tuple, the line numbers are one based.
+    """
+    clock = stats.Clock()
+    sourceIndex = SourceIndex(source)
+    table = FindInitializerTable(source, sourceIndex)
+    lineNumbers = array.array('l', [sourceIndex.GetLine(startIndex) + 1 for startIndex in table.StartIndices])
+    stats.AddStage("scan", clock, 1, len(source))
+    return (table, lineNumbers)
+
+
+class FileTask(object):
+    """
+    A file passing through the stages of RunFileTasks. The binary content is only kept until the file is expanded and
+    the expanded source until it's written.
+    """
+    def __init__(self, job):
+        super(FileTask, self).__init__()
+        self.Job = job
+        self.Result = ProcessResult(job.SourceFileName)
+        self.Stats = Stats.Stats() if job.CollectStats else Stats.g_nullStats
+        self.Content = None
+        self.Source = None
+        self.IsDone = False
+
+
+def SetTaskError(task, ex):
+    """
+    Errors are captured in the ProcessResult so one bad file does not abort the entire run, must be called from the except block.
+    """
+    import traceback
+    task.Result.Error = str(ex)
+    task.Result.Traceback = traceback.format_exc()
+    task.Content = None
+    task.Source = None
+    task.IsDone = True
+
+
+def ReadFileTask(task):
+    """
+    The read stage, only targets are read and the content is hashed so unchanged files can be recognized.
+    """
+    job = task.Job
+    try:
+        clock = task.Stats.Clock()
+        binaryContent = TryReadTargetFile(job.SourceFileName, job.All)
+        if binaryContent != None and job.HashContent:
+            task.Result.ContentHash = hashlib.sha1(binaryContent).hexdigest()
+            task.Result.Unchanged = task.Result.ContentHash == job.KnownContentHash
+        task.Stats.AddStage("prefilter", clock, 1, len(binaryContent) if binaryContent != None else 0)
+        task.IsDone = binaryContent == None or task.Result.Unchanged
+        if not task.IsDone:
+            task.Content = binaryContent
+    except (Exception) as ex:
+        SetTaskError(task, ex)
+    return task
+
+
+def ExpandFileTask(task):
+    """
+    The expand stage, this is executed by the worker processes when running with multiple jobs.
+    """
+    job = task.Job
+    try:
+        sourceContent = IOUtil.DecodeText(task.Content)
+        task.Content = None
+        targetFileName = GetTargetFileName(job.SourceFileName, job.Overwrite)
+        result, task.Source = ExpandSourceFile(job.SourceFileName, targetFileName, GetCodeReplacementDict(), sourceContent, task.Stats)
+        result.ContentHash = task.Result.ContentHash
+        task.Result = result
+        task.IsDone = task.Source == None
+    except (Exception) as ex:
+        SetTaskError(task, ex)
+    return task
+
+
+def WriteFileTask(task):
+    """
+    The write stage.
+    """
+    try:
+        WriteTargetFile(task.Result, None, task.Source, task.Stats)
+        task.Source = None
+        task.IsDone = True
+    except (Exception) as ex:
+        SetTaskError(task, ex)
+    return task
 
 
-def IsTarget(file):
-    content = IOUtil.ReadFile(file)
-    return ("public VulkanExampleBase" in content and not TAG_SEARCH in content)
+def AnalyzeFileTask(task):
+    """
+    The --analyze counterpart of ExpandFileTask, the file is only scanned and the result carries its RecordTable.
+    """
+    try:
+        task.Result.Processed = True
+        task.Result.Table, task.Result.LineNumbers = AnalyzeSource(IOUtil.DecodeText(task.Content), task.Stats)
+        task.Content = None
+        task.IsDone = True
+    except (Exception) as ex:
+        SetTaskError(task, ex)
+    return task
+
+
+# The number of files that can be in the pipeline for each job, this limits the file contents held in memory
+PIPELINE_FILES_PER_JOB = 4
+
+
+def RunFileTasks(jobs, args, processFunction, writeTargets):
+    """
+    Run the jobs through a pipeline where the files are read by a pool of --io-threads threads, the processFunction
+    runs on a process pool when running with multiple jobs (on a single thread otherwise) and the targets are written by
+    a single writer thread. So the disks and the cores are kept busy at the same time.
+    The jobs can be a generator, it's consumed as the pipeline has room for more files.
+    The ProcessResults are returned in the same order as the jobs no matter how the work was scheduled.
+    """
+    import concurrent.futures
+    from VulkanWillemsExpander import Pipeline
+    jobCount = max(1, GetJobCount(args))
+    ioThreadCount = max(1, args.io_threads)
+    executors = [concurrent.futures.ThreadPoolExecutor(ioThreadCount)]
+    if jobCount > 1:
+        executors.append(concurrent.futures.ProcessPoolExecutor(jobCount, initializer=InitializeWorker, initargs=(g_methodTableFileName, g_useVectorizedScan)))
+    else:
+        executors.append(concurrent.futures.ThreadPoolExecutor(1))
+    stages = [Pipeline.Stage(executors[0], ReadFileTask), Pipeline.Stage(executors[1], processFunction)]
+    if writeTargets:
+        executors.append(concurrent.futures.ThreadPoolExecutor(1))
+        stages.append(Pipeline.Stage(executors[2], WriteFileTask))
+    pipeline = Pipeline.Pipeline(stages, PIPELINE_FILES_PER_JOB * jobCount + ioThreadCount, lambda task: task.IsDone)
+    try:
+        for task in pipeline.Run(FileTask(job) for job in jobs):
+            if task.Job.CollectStats:
+                task.Result.Stats = task.Stats
+            yield task.Result
+    finally:
+        for executor in executors:
+            executor.shutdown()
+
+
+def GetJobCount(args):
+    if args.jobs > 0:
+        return args.jobs
+    import multiprocessing
+    return multiprocessing.cpu_count()
+
+
+def RunRegistryCommands(args):
+    """
+    Validate the active method tables against the registry and/or write a method table that adds the sType and pNext
+    defaults of every registry struct that has no parameterless method yet.
+    """
+    global __g_verbosityLevel
+    from VulkanWillemsExpander import Registry
+    index = Registry.LoadRegistryIndex(args.registry)
+    if __g_verbosityLevel > 0:
+        print("Loaded %s structs from '%s'" % (len(index), args.registry))
+    if args.validate_methods:
+        warningCount = 0
+        for entry in g_allMethods:
+            for warning in Registry.ValidateMethod(index, entry.Name, entry.ExpansionParameters):
+                print(warning)
+                warningCount = warningCount + 1
+        print("Validated %s methods, %s warnings" % (len(g_allMethods), warningCount))
+    if args.generate_methods:
+        from VulkanWillemsExpander import MethodTable
+        existingMethods = set((entry.Name, entry.ParameterCount) for entry in g_allMethods)
+        generatedMethods = [MethodInfo(name, parameterCount, expansionParameters) for name, parameterCount, expansionParameters in Registry.GenerateDefaultMethods(index, existingMethods)]
+        MethodTable.Save(args.generate_methods, g_allMethods + generatedMethods, g_ignoreMethods)
+        print("Generated %s methods, '%s' can be used with --methods" % (len(generatedMethods), args.generate_methods))
+
+
+def CreateStats(args):
+    return Stats.Stats() if args.stats or args.stats_json else Stats.g_nullStats
+
+
+def ReportStats(stats, args, file=sys.stdout):
+    if not stats.IsEnabled:
+        return
+    stats.Stop()
+    if args.stats:
+        stats.Print(file)
+    if args.stats_json:
+        stats.Save(args.stats_json)
+
+
+def IsMatchedMethod(name, parameterCount):
+    dictParams = GetCodeReplacementDict().get(name)
+    return dictParams != None and parameterCount in dictParams
+
+
+def Analyze(sourceFileName, args):
+    """
+    Scan the file or the tree and write a inventory of the initializer calls to the args.analyze report, nothing is
+    patched or written.
+    """
+    global __g_verbosityLevel
+    global __g_debugEnabled
+    from VulkanWillemsExpander import Analysis
+    stats = CreateStats(args)
+    inventory = Analysis.Inventory([ToUseCaseString(value) for value in range(UseCase.Unknown + 1)])
+    if not args.recursive:
+        sourceFile = IOUtil.ReadFile(sourceFileName)
+        table, lineNumbers = AnalyzeSource(sourceFile, stats)
+        stats.AddRecords(len(table), inventory.Add(sourceFileName, table, lineNumbers, IsMatchedMethod))
+    else:
+        if not sourceFileName:
+            sourceFileName = IOUtil.NormalizePath(os.getcwd())
+        files = TimeWalk(CollectCandidateFiles(sourceFileName, args, CreateFileFilter(sourceFileName, args)), stats)
+        jobs = (FileJob(file, False, args.all, False, None, stats.IsEnabled) for file in files if not MAGIC_TAG in file)
+        jobCount = 0
+        errorCount = 0
+        for result in RunFileTasks(jobs, args, AnalyzeFileTask, False):
+            jobCount = jobCount + 1
+            if result.Stats != None:
+                stats.Merge(result.Stats)
+            if result.Error != None:
+                errorCount = errorCount + 1
+                print("ERROR: %s: %s" % (result.SourceFileName, result.Error))
+                if __g_debugEnabled:
+                    print(result.Traceback)
+            elif result.Table != None:
+                if( __g_verbosityLevel > 1 ):
+                    print("Analyzing: %s" % (result.SourceFileName))
+                stats.AddRecords(len(result.Table), inventory.Add(result.SourceFileName, result.Table, result.LineNumbers, IsMatchedMethod))
+        if errorCount > 0:
+            print("ERROR: %s of %s files failed" % (errorCount, jobCount))
+    inventory.Save(args.analyze)
+    if __g_verbosityLevel > 0:
+        print("Analyzed %s files, %s initializer calls of %s overloads, %s without a expansion, report written to '%s'" %
+              (inventory.FileCount, inventory.RecordCount, len(inventory.Usages), inventory.UnmatchedCount, args.analyze))
+    ReportStats(stats, args)
 
 
 def Process(sourceFileName, targetFileName, args):
     global __g_verbosityLevel
+    global __g_debugEnabled
     if not sourceFileName and not args.recursive:
         return
 
-    if not args.recursive:
-        ProcessFile(sourceFileName, targetFileName, args.overwrite)
+    if args.analyze:
+        Analyze(sourceFileName, args)
+        return
+
+    stats = CreateStats(args)
+    if sourceFileName == STREAM_NAME or targetFileName == STREAM_NAME:
+        ProcessStream(sourceFileName, targetFileName, GetCodeReplacementDict(), stats, args.fsync)
+        # stdout might be the expanded source
+        ReportStats(stats, args, sys.stderr)
+    elif not args.recursive:
+        result = ProcessFile(sourceFileName, targetFileName, args.overwrite, GetCodeReplacementDict(), None, stats)
+        for warning in result.Warnings:
+            print(warning)
+        if result.Written and args.fsync:
+            IOUtil.SyncFiles([result.TargetFileName])
+        if result.Status == ExpandStatus.NothingToExpand and __g_verbosityLevel > 0:
+            print("Nothing to expand in '%s'" % (sourceFileName))
+        ReportStats(stats, args)
     else:
         if not sourceFileName: 
             sourceFileName = IOUtil.NormalizePath(os.getcwd())
-        files = IOUtil.GetFilePaths(sourceFileName, None)
-        files = [file for file in files if file.lower().endswith(".cpp") or file.lower().endswith(".hpp")]
+        fileFilter = CreateFileFilter(sourceFileName, args)
+        # The watcher is started before the initial run so the files edited while it runs are picked up afterwards
+        watcher = CreateFileWatcher(sourceFileName, args, fileFilter) if args.watch else None
+        try:
+            files = TimeWalk(CollectCandidateFiles(sourceFileName, args, fileFilter), stats)
+            ProcessFiles(files, args, stats)
+            if watcher != None:
+                WatchFiles(sourceFileName, args, fileFilter, watcher)
+        finally:
+            if watcher != None:
+                watcher.Close()
+
+
+CANDIDATE_EXTENSIONS = [".cpp", ".hpp"]
+# The version control directories never contain example sources, they are skipped without being entered
+DEFAULT_EXCLUDED_DIRECTORIES = [".git", ".hg", ".svn"]
+DEFAULT_EXCLUDES = ["*vulkantools.h", "*vulkantools.cpp"]
+
+
+def CreateFileFilter(directory, args):
+    """
+    Combine the built in filters, the config file and the --include/--exclude/--exclude-dir options into the FileFilter
+    of a recursive run. The config file is --config or the DEFAULT_CONFIG_FILENAME in the directory if it exists.
+    """
+    from VulkanWillemsExpander import FileFilter
+    includes = []
+    excludes = list(DEFAULT_EXCLUDES)
+    excludedDirectories = set(DEFAULT_EXCLUDED_DIRECTORIES)
+    configFileName = args.config
+    if configFileName == None and IOUtil.IsFile(IOUtil.Join(directory, FileFilter.DEFAULT_CONFIG_FILENAME)):
+        configFileName = IOUtil.Join(directory, FileFilter.DEFAULT_CONFIG_FILENAME)
+    if configFileName != None:
+        configIncludes, configExcludes, configExcludedDirectories = FileFilter.LoadConfig(configFileName)
+        includes = includes + configIncludes
+        excludes = excludes + configExcludes
+        excludedDirectories.update(configExcludedDirectories)
+    if args.include:
+        includes = includes + args.include
+    if args.exclude:
+        excludes = excludes + args.exclude
+    if args.exclude_dir:
+        excludedDirectories.update(args.exclude_dir)
+    return FileFilter.FileFilter(directory, CANDIDATE_EXTENSIONS, includes, excludes, excludedDirectories)
+
+
+def GetCandidateFiles(fileFilter):
+    return fileFilter.WalkFiles()
+
+
+def CollectCandidateFiles(directory, args, fileFilter):
+    """
+    Generate the candidate files of a recursive run, the walk is streamed so the first files are processed while the
+    rest of the tree is still being walked. With --since only the files that git reports as changed since the ref are
+    generated (sorted), the entire tree is walked if git can't tell.
+    """
+    global __g_verbosityLevel
+    if args.since:
+        from VulkanWillemsExpander import GitChanges
+        changedFiles = GitChanges.TryGetChangedFiles(directory, args.since)
+        if changedFiles != None:
+            files = fileFilter.FilterPaths(changedFiles)
+            if __g_verbosityLevel > 0:
+                print("%s of the %s files changed since '%s' are candidates" % (len(files), len(changedFiles), args.since))
+            for file in files:
+                yield file
+            return
+        else:
+            print("WARNING: Unable to get the files changed since '%s' from git, processing all files" % (args.since))
+    for file in GetCandidateFiles(fileFilter):
+        yield file
+
+
+def TimeWalk(files, stats):
+    """
+    Pass the files through while recording the time spent producing them as the walk stage.
+    """
+    iterator = iter(files)
+    while True:
+        clock = stats.Clock()
+        file = next(iterator, None)
+        if file == None:
+            stats.AddStage("walk", clock, 0)
+            return
+        stats.AddStage("walk", clock)
+        yield file
+
+
+def ProcessFiles(files, args, stats=None):
+    global __g_verbosityLevel
+    if stats == None:
+        stats = CreateStats(args)
+    manifest = None
+    if args.manifest:
+        from VulkanWillemsExpander.Manifest import Manifest
+        fingerprint = "%s:%s:%s" % (GetMethodFingerprint(), args.all, args.overwrite)
+        manifest = Manifest.Load(args.manifest, fingerprint)
+    statistics = RunStatistics()
+
+    def CreateJobs():
+        # Consumed lazily by the pipeline, so the files are checked as the walk produces them
         for file in files:
-            if not (file.endswith("vulkantools.h") or file.endswith("vulkantools.cpp")):
-                if not MAGIC_TAG in file and (args.all or IsTarget(file)):
-                    if( __g_verbosityLevel > 0 ):
-                        print("Processing: %s" % (file))
-                    ProcessFile(file, None, args.overwrite)
-                else:
+            statistics.FileCount = statistics.FileCount + 1
+            if not MAGIC_TAG in file:
+                if manifest != None and manifest.IsUnchanged(file):
+                    statistics.UnchangedCount = statistics.UnchangedCount + 1
                     if( __g_verbosityLevel > 1 ):
-                        print("Skipping: %s" % (file))
+                        print("Unchanged: %s" % (file))
+                    continue
+                knownContentHash = manifest.TryGetContentHash(file) if manifest != None else None
+                yield FileJob(file, args.overwrite, args.all, manifest != None, knownContentHash, stats.IsEnabled)
+            else:
+                statistics.SkippedCount = statistics.SkippedCount + 1
+                if( __g_verbosityLevel > 1 ):
+                    print("Skipping: %s" % (file))
+
+    try:
+        ProcessJobs(CreateJobs(), args, manifest, statistics, stats)
+    finally:
+        if manifest != None:
+            manifest.Save(args.manifest)
+    if __g_verbosityLevel > 0:
+        statistics.Print()
+    ReportStats(stats, args)
 
 
+WATCH_DEBOUNCE_TIME = 0.5
+WATCH_POLL_INTERVAL = 1.0
+
+
+def CreateFileWatcher(directory, args, fileFilter):
+    from VulkanWillemsExpander import Watcher
+    return Watcher.CreateWatcher(directory, lambda: GetCandidateFiles(fileFilter), args.watch_poll, WATCH_POLL_INTERVAL,
+                                 fileFilter.ExcludedDirectories, fileFilter.IsExcludedDirectory)
+
+
+def WatchFiles(directory, args, fileFilter, watcher):
+    """
+    Keep watching the directory and process the candidate files as they change, the caller owns and closes the watcher.
+    """
+    global __g_verbosityLevel
+    from VulkanWillemsExpander import Watcher
+
+    def OnChanges(changedFiles):
+        # The targets we write ourselves are ignored
+        files = [file for file in changedFiles if fileFilter.IsIncludedFile(file) and not MAGIC_TAG in file and IOUtil.IsFile(file)]
+        if len(files) > 0:
+            ProcessFiles(files, args)
+
+    if __g_verbosityLevel > 0:
+        print("Watching '%s' using %s, press Ctrl+C to stop" % (directory, type(watcher).__name__))
+    try:
+        Watcher.Watch(watcher, WATCH_DEBOUNCE_TIME, OnChanges)
+    except KeyboardInterrupt:
+        pass
+
+
+class RunStatistics(object):
+    def __init__(self):
+        super(RunStatistics, self).__init__()
+        self.FileCount = 0
+        self.SkippedCount = 0
+        self.UnchangedCount = 0
+        self.ExpandedCount = 0
+        self.NothingToExpandCount = 0
+        self.AlreadyExpandedCount = 0
+        self.WrittenCount = 0
+        self.ErrorCount = 0
+
+    def Add(self, result):
+        if result.Error != None:
+            self.ErrorCount = self.ErrorCount + 1
+        elif result.Unchanged:
+            self.UnchangedCount = self.UnchangedCount + 1
+        elif not result.Processed:
+            self.SkippedCount = self.SkippedCount + 1
+        elif result.Status == ExpandStatus.Expanded:
+            self.ExpandedCount = self.ExpandedCount + 1
+        elif result.Status == ExpandStatus.NothingToExpand:
+            self.NothingToExpandCount = self.NothingToExpandCount + 1
+        elif result.Status == ExpandStatus.AlreadyExpanded:
+            self.AlreadyExpandedCount = self.AlreadyExpandedCount + 1
+        if result.Written:
+            self.WrittenCount = self.WrittenCount + 1
+
+    def Print(self):
+        print("Files: %s, expanded: %s, written: %s, nothing to expand: %s, already expanded: %s, skipped: %s, unchanged: %s, errors: %s" %
+              (self.FileCount, self.ExpandedCount, self.WrittenCount, self.NothingToExpandCount, self.AlreadyExpandedCount, self.SkippedCount, self.UnchangedCount, self.ErrorCount))
+
+
+def ProcessJobs(jobs, args, manifest, statistics, stats):
+    global __g_verbosityLevel
+    global __g_debugEnabled
+    writtenFileNames = []
+    jobCount = 0
+    for result in RunFileTasks(jobs, args, ExpandFileTask, True):
+        jobCount = jobCount + 1
+        statistics.Add(result)
+        if result.Written:
+            writtenFileNames.append(result.TargetFileName)
+        if result.Stats != None:
+            stats.Merge(result.Stats)
+        if manifest != None:
+            if result.Error != None:
+                manifest.Remove(result.SourceFileName)
+            elif result.Unchanged:
+                manifest.UpdateFileStat(result.SourceFileName)
+            else:
+                manifest.Update(result.SourceFileName, result.ContentHash, result.TargetFileName)
+
+        if result.Unchanged:
+            if( __g_verbosityLevel > 1 ):
+                print("Unchanged: %s" % (result.SourceFileName))
+        elif result.Processed:
+            if( __g_verbosityLevel > 0 ):
+                print("Processing: %s" % (result.SourceFileName))
+        else:
+            if( __g_verbosityLevel > 1 ):
+                print("Skipping: %s" % (result.SourceFileName))
+        for warning in result.Warnings:
+            print(warning)
+        if result.Error != None:
+            print("ERROR: %s: %s" % (result.SourceFileName, result.Error))
+            if __g_debugEnabled:
+                print(result.Traceback)
+    if statistics.ErrorCount > 0:
+        print("ERROR: %s of %s files failed" % (statistics.ErrorCount, jobCount))
+    if args.fsync and len(writtenFileNames) > 0:
+        # One batch at the end is much cheaper than syncing every file as it's written
+        IOUtil.SyncFiles(writtenFileNames)
+
 
 def main():
     global __g_verbosityLevel
+    global g_useVectorizedScan
     global __g_debugEnabled
     global __g_allowDevelopmentPlugins
 
@@ -914,25 +1863,77 @@ def main():
     ### Add the main command line arguments
     parser = argparse.ArgumentParser(description='Quick python script to help make the Vulkan source examples from https://github.com/SaschaWillems/Vulkan more verbose.')
     AddDefaultOptions(parser)
-    parser.add_argument("inputFile",  nargs='?', help="the name of the input file")
-    parser.add_argument("outputFile", nargs='?', default=None, help="the name of the output file")
+    parser.add_argument("inputFile",  nargs='?', help="the name of the input file, '-' reads the source from stdin")
+    parser.add_argument("outputFile", nargs='?', default=None, help="the name of the output file, '-' writes the result to stdout (the default if the input is '-')")
     parser.add_argument('-r', '--recursive', action='store_true',  help="Scan the given path recursively for .hpp and .cpp files that contain 'public VulkanExampleBase' and process those that do")
+    parser.add_argument('--exclude-dir', metavar='NAME', action='append', default=None, help="In recursive mode don't enter directories with this name (for example build or external), can be repeated. The %s directories are always excluded" % (", ".join(DEFAULT_EXCLUDED_DIRECTORIES)))
+    parser.add_argument('--include', metavar='GLOB', action='append', default=None, help="In recursive mode only process the .cpp and .hpp files matching this glob (relative to the directory, can be repeated), by default all of them are processed")
+    parser.add_argument('--exclude', metavar='GLOB', action='append', default=None, help="In recursive mode skip the files and directories matching this glob, can be repeated. Excluded directories are never entered")
+    parser.add_argument('--config', metavar='FILE', default=None, help="A json file with \"include\", \"exclude\" and \"excludeDirectories\" lists for recursive runs, defaults to .vulkanwillemsexpander.json in the directory if it exists")
     parser.add_argument('--all', action='store_true',  help="If recursive mode and 'all' is enabled, then all hpp and cpp files are modified")
     parser.add_argument('--overwrite', action='store_true',  help="Overwrite the input file(s), this only works if no outputFile is specified")
+    parser.add_argument('--manifest', default=None, help="In recursive mode record the processed files in this manifest file and skip files that are unchanged since the last run")
+    parser.add_argument('-j', '--jobs', type=int, default=1, help="The number of files to process in parallel in recursive mode, 0 uses one job per cpu")
+    parser.add_argument('--vectorized-scan', action='store_true',  help="Scan sources of %sK or more with numpy if it's installed, this is only faster for sources with deeply nested call parameters" % (VECTORIZED_SCAN_MIN_SIZE // 1024))
+    parser.add_argument('--fsync', action='store_true',  help="Flush the written files to disk at the end of the run")
+    parser.add_argument('--io-threads', type=int, default=4, help="The number of threads reading files in recursive mode, the reads overlap with the expansion of the files read before")
+    parser.add_argument('--since', metavar='REF', default=None, help="In recursive mode only process the files that changed since this git ref and the untracked files, all files are processed if git is not available")
+    parser.add_argument('--watch', action='store_true',  help="In recursive mode keep running and process files again when they change")
+    parser.add_argument('--watch-poll', action='store_true',  help="Detect changes in watch mode by polling even if inotify is available")
+    parser.add_argument('--daemon', metavar='SOCKET', default=None, help="Run as a daemon that serves expansion requests on the given unix socket, see VulkanWillemsExpanderClient.py")
+    parser.add_argument('--stats', action='store_true',  help="Print the time spent and the files and bytes processed by each stage")
+    parser.add_argument('--stats-json', metavar='FILE', default=None, help="Write the stage statistics to this json file")
+    parser.add_argument('--methods', metavar='FILE', default=None, help="Load the method tables from this json file instead of using the built in tables, the validated tables are cached in FILE.cache")
+    parser.add_argument('--export-methods', metavar='FILE', default=None, help="Write the method tables to this json file and exit, this is a good starting point for a custom --methods file")
+    parser.add_argument('--registry', metavar='VK_XML', default=None, help="A local copy of the Vulkan registry vk.xml used by --validate-methods and --generate-methods, its struct index is cached in VK_XML.index")
+    parser.add_argument('--validate-methods', action='store_true',  help="Validate the field names and sType values of the method tables against the --registry and exit")
+    parser.add_argument('--generate-methods', metavar='FILE', default=None, help="Write a method table that adds the sType/pNext defaults of all --registry structs without a parameterless method and exit")
+    parser.add_argument('--analyze', metavar='REPORT', default=None, help="Only scan and classify the initializer calls of the file or tree and write a report of the used overloads to this .json or .csv file, nothing is modified")
+    parser.add_argument('--profile', metavar='FILE', default=None, help="Run under cProfile and write the profile to this .prof file, with multiple jobs only the main process is profiled")
 
     try:
         args = parser.parse_args()
-        Process(args.inputFile, args.outputFile, args)
+        if args.recursive and STREAM_NAME in (args.inputFile, args.outputFile):
+            parser.error("'%s' can not be used in recursive mode" % (STREAM_NAME))
+        if args.since and not args.recursive:
+            parser.error("--since requires --recursive")
+        if (args.watch or args.manifest) and not args.recursive:
+            parser.error("--watch and --manifest require --recursive")
+        if args.analyze and (args.outputFile or args.watch or args.inputFile == STREAM_NAME):
+            parser.error("--analyze only takes a input file or directory")
+        if (args.validate_methods or args.generate_methods) and not args.registry:
+            parser.error("--validate-methods and --generate-methods require --registry")
+        if args.methods:
+            UseMethodTable(args.methods)
+        g_useVectorizedScan = args.vectorized_scan
+        if args.export_methods:
+            from VulkanWillemsExpander import MethodTable
+            MethodTable.Save(args.export_methods, g_allMethods, g_ignoreMethods)
+        elif args.validate_methods or args.generate_methods:
+            RunRegistryCommands(args)
+        elif args.daemon:
+            RunDaemon(args.daemon)
+        elif args.profile:
+            import cProfile
+            profiler = cProfile.Profile()
+            try:
+                profiler.runcall(Process, args.inputFile, args.outputFile, args)
+            finally:
+                profiler.dump_stats(args.profile)
+        else:
+            Process(args.inputFile, args.outputFile, args)
     except (IOError) as ex:
         ShowTitleIfNecessary()
-        print("ERROR: %s" % ex.strerror)
+        # Errors raised with only a message have no strerror
+        print("ERROR: %s" % (ex.strerror if ex.strerror else ex))
         if __g_debugEnabled:
             raise
     except (Exception) as ex:
         ShowTitleIfNecessary()
-        print("ERROR: %s" % ex.message)
+        print("ERROR: %s" % ex)
         if __g_debugEnabled:
             raise
     return
 
-main()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
\ No newline at end of file
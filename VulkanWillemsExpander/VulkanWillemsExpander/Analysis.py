@@ -0,0 +1,126 @@
+#***************************************************************************************************************************************************
+#* BSD 3-Clause License
+#*
+#* Copyright (c) 2016, Rene Thrane
+#* All rights reserved.
+#* 
+#* Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#* 
+#* 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#* 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the 
+#*    documentation and/or other materials provided with the distribution.
+#* 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this 
+#*    software without specific prior written permission.
+#* 
+#* THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, 
+#* THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR 
+#* CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, 
+#* PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF 
+#* LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, 
+#* EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#***************************************************************************************************************************************************
+
+# Tree wide inventory of the initializer calls, produced by the --analyze mode.
+#
+# The calls are counted per method overload (name and parameter count) and per use case, overloads that have no
+# expansion in the method tables are reported with the locations of their first calls.
+
+import csv
+import json
+import os
+
+ANALYSIS_VERSION = 1
+# The number of locations recorded for each overload without a expansion
+MAX_LOCATIONS = 20
+
+
+class MethodUsage(object):
+    def __init__(self, name, parameterCount, isMatched, useCaseCount):
+        super(MethodUsage, self).__init__()
+        self.Name = name
+        self.ParameterCount = parameterCount
+        self.IsMatched = isMatched
+        self.Count = 0
+        self.FileNames = set()
+        self.UseCaseCounts = [0] * useCaseCount
+        self.Locations = []
+
+
+class Inventory(object):
+    def __init__(self, useCaseNames):
+        super(Inventory, self).__init__()
+        self.UseCaseNames = useCaseNames
+        self.Usages = {}
+        self.FileCount = 0
+        self.RecordCount = 0
+        self.UnmatchedCount = 0
+
+    def Add(self, fileName, table, lineNumbers, isMatched):
+        """
+        Add the records of a file's RecordTable, isMatched(name, parameterCount) tells if a overload has a expansion.
+        Returns the number of records without a expansion.
+        """
+        self.FileCount = self.FileCount + 1
+        unmatchedCount = 0
+        for index in range(len(table)):
+            key = (table.GetName(index), table.ParameterCounts[index])
+            usage = self.Usages.get(key)
+            if usage == None:
+                usage = MethodUsage(key[0], key[1], isMatched(key[0], key[1]), len(self.UseCaseNames))
+                self.Usages[key] = usage
+            usage.Count = usage.Count + 1
+            usage.FileNames.add(fileName)
+            usage.UseCaseCounts[table.UseCases[index]] += 1
+            if not usage.IsMatched:
+                unmatchedCount = unmatchedCount + 1
+                if len(usage.Locations) < MAX_LOCATIONS:
+                    usage.Locations.append("%s:%s" % (fileName, lineNumbers[index]))
+        self.RecordCount = self.RecordCount + len(table)
+        self.UnmatchedCount = self.UnmatchedCount + unmatchedCount
+        return unmatchedCount
+
+    def GetSortedUsages(self):
+        """
+        The most used overloads first.
+        """
+        return sorted(self.Usages.values(), key=lambda usage: (-usage.Count, usage.Name, usage.ParameterCount))
+
+    def ToDict(self):
+        methods = []
+        for usage in self.GetSortedUsages():
+            methods.append({
+                "name": usage.Name,
+                "parameterCount": usage.ParameterCount,
+                "matched": usage.IsMatched,
+                "count": usage.Count,
+                "files": len(usage.FileNames),
+                "useCases": dict((name, count) for name, count in zip(self.UseCaseNames, usage.UseCaseCounts) if count > 0),
+                "locations": usage.Locations,
+            })
+        return {
+            "version": ANALYSIS_VERSION,
+            "files": self.FileCount,
+            "records": self.RecordCount,
+            "unmatched": self.UnmatchedCount,
+            "methods": methods,
+        }
+
+    def SaveJson(self, filename):
+        with open(filename, "w") as theFile:
+            json.dump(self.ToDict(), theFile, indent=1)
+
+    def SaveCsv(self, filename):
+        with open(filename, "w", newline="") as theFile:
+            writer = csv.writer(theFile)
+            writer.writerow(["name", "parameterCount", "matched", "count", "files"] + self.UseCaseNames)
+            for usage in self.GetSortedUsages():
+                writer.writerow([usage.Name, usage.ParameterCount, int(usage.IsMatched), usage.Count, len(usage.FileNames)] + usage.UseCaseCounts)
+
+    def Save(self, filename):
+        """
+        Save the report as csv if the filename ends with .csv and as json otherwise.
+        """
+        if os.path.splitext(filename)[1].lower() == ".csv":
+            self.SaveCsv(filename)
+        else:
+            self.SaveJson(filename)
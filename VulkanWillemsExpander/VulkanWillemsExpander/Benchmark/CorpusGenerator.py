@@ -0,0 +1,127 @@
+#***************************************************************************************************************************************************
+#* BSD 3-Clause License
+#*
+#* Copyright (c) 2016, Rene Thrane
+#* All rights reserved.
+#* 
+#* Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#* 
+#* 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#* 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the 
+#*    documentation and/or other materials provided with the distribution.
+#* 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this 
+#*    software without specific prior written permission.
+#* 
+#* THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, 
+#* THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR 
+#* CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, 
+#* PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF 
+#* LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, 
+#* EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#***************************************************************************************************************************************************
+
+# Generates synthetic sources in the style of the Sascha Willems Vulkan examples.
+#
+# The generated file is a 'VulkanExample : public VulkanExampleBase' class where every method is called in each of the
+# requested use cases, the calls are spread over member functions and mixed with filler code and comments so the
+# density of initializer calls is close to the real examples.
+
+import random
+
+USE_CASE_INITIALIZER = "Initializer"
+USE_CASE_FUNCTION_PARAMETER = "FunctionParameter"
+USE_CASE_ARRAY_PARAMETER = "ArrayParameter"
+USE_CASE_MEMBER_ASSIGNMENT = "MemberAssignment"
+
+ALL_USE_CASES = [USE_CASE_INITIALIZER, USE_CASE_FUNCTION_PARAMETER, USE_CASE_ARRAY_PARAMETER, USE_CASE_MEMBER_ASSIGNMENT]
+
+STATEMENTS_PER_FUNCTION = 24
+
+g_parameterSamples = [
+    "VK_SHADER_STAGE_VERTEX_BIT",
+    "static_cast<uint32_t>(poolSizes.size())",
+    "poolSizes.data()",
+    "&descriptorSetLayout",
+    "1",
+    "0",
+    "VK_FALSE",
+    "width",
+    "(float)height",
+    "&uniformBuffer.descriptor",
+    "textures.colorMap.view",
+    "VK_DESCRIPTOR_TYPE_COMBINED_IMAGE_SAMPLER",
+]
+
+g_fillerSamples = [
+    "VK_CHECK_RESULT(vkCreatePipelineLayout(device, &pipelineLayoutCreateInfo, nullptr, &pipelineLayout));",
+    "vkCmdBindPipeline(drawCmdBuffers[i], VK_PIPELINE_BIND_POINT_GRAPHICS, pipelines.solid);",
+    "// Bind the descriptor set for rendering a mesh using the dynamic offset",
+    "uniformData.projection = glm::perspective(glm::radians(60.0f), (float)width / (float)height, 0.1f, 256.0f);",
+    "std::array<VkPipelineShaderStageCreateInfo, 2> shaderStages;",
+    "shaderStages[0] = loadShader(getAssetPath() + \"shaders/mesh/mesh.vert.spv\", VK_SHADER_STAGE_VERTEX_BIT);",
+    "/* The attachments are cleared at the start of the render pass */",
+    "vkCmdDrawIndexed(drawCmdBuffers[i], indexCount, 1, 0, 0, 0);",
+]
+
+
+def GetTypeName(methodName):
+    return "Vk%s%s" % (methodName[0].upper(), methodName[1:])
+
+
+def GenerateParameters(rnd, parameterCount, multiline):
+    parameters = [rnd.choice(g_parameterSamples) for i in range(parameterCount)]
+    if not multiline or parameterCount == 0:
+        return ", ".join(parameters)
+    return "\n\t\t\t\t" + ",\n\t\t\t\t".join(parameters)
+
+
+def GenerateStatement(rnd, method, useCase, index):
+    name, parameterCount = method
+    multiline = rnd.random() < 0.5
+    call = "vks::initializers::%s(%s)" % (name, GenerateParameters(rnd, parameterCount, multiline))
+    if useCase == USE_CASE_INITIALIZER:
+        if multiline:
+            return "\t\t%s value%s =\n\t\t\t%s;\n" % (GetTypeName(name), index, call)
+        return "\t\t%s value%s = %s;\n" % (GetTypeName(name), index, call)
+    elif useCase == USE_CASE_FUNCTION_PARAMETER:
+        return "\t\tvkCmdUse%s(drawCmdBuffers[i], 1, &%s);\n" % (index, call)
+    elif useCase == USE_CASE_ARRAY_PARAMETER:
+        return "\t\tstd::vector<%s> values%s =\n\t\t{\n\t\t\t%s,\n\t\t\t%s\n\t\t};\n" % (GetTypeName(name), index, call, call)
+    elif useCase == USE_CASE_MEMBER_ASSIGNMENT:
+        return "\t\tpipelineCreateInfo.member%s = %s;\n" % (index, call)
+    raise Exception("Unknown use case '%s'" % (useCase))
+
+
+def GenerateSource(methods, targetSize, seed=0, useCases=ALL_USE_CASES, callsPerUseCase=1, fillerLines=2):
+    """
+    Generate a source of at least targetSize characters.
+    methods is a list of (name, parameterCount) tuples, every method is emitted callsPerUseCase times in each use case
+    before moving on to the next method and the calls are separated by fillerLines lines of filler code.
+    """
+    rnd = random.Random(seed)
+    content = ["#include \"vulkanexamplebase.h\"\n\nclass VulkanExample : public VulkanExampleBase\n{\npublic:\n"]
+    size = len(content[0])
+    index = 0
+    functionIndex = 0
+    while size < targetSize:
+        function = ["\tvoid setup%s()\n\t{\n" % (functionIndex)]
+        functionSize = len(function[0])
+        for i in range(STATEMENTS_PER_FUNCTION):
+            method = methods[(index // (len(useCases) * callsPerUseCase)) % len(methods)]
+            useCase = useCases[(index // callsPerUseCase) % len(useCases)]
+            statement = [GenerateStatement(rnd, method, useCase, index)]
+            for j in range(fillerLines):
+                statement.append("\t\t%s\n" % (rnd.choice(g_fillerSamples)))
+            statementContent = "".join(statement)
+            function.append(statementContent)
+            functionSize = functionSize + len(statementContent)
+            index = index + 1
+            if size + functionSize >= targetSize:
+                break
+        function.append("\t}\n\n")
+        functionIndex = functionIndex + 1
+        functionContent = "".join(function)
+        content.append(functionContent)
+        size = size + len(functionContent)
+    content.append("};\n")
+    return "".join(content)
@@ -0,0 +1,71 @@
+#***************************************************************************************************************************************************
+#* BSD 3-Clause License
+#*
+#* Copyright (c) 2016, Rene Thrane
+#* All rights reserved.
+#* 
+#* Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#* 
+#* 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#* 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the 
+#*    documentation and/or other materials provided with the distribution.
+#* 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this 
+#*    software without specific prior written permission.
+#* 
+#* THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, 
+#* THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR 
+#* CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, 
+#* PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF 
+#* LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, 
+#* EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#***************************************************************************************************************************************************
+
+# Times the individual stages of the expansion of a source.
+#
+# The source is expanded by the tool's own ExpandSourceFile and WriteTargetFile and the stage times are read from the
+# Stats they record, so the benchmark always measures the stages the tool actually runs. The tool module is supplied
+# by the caller so the benchmark always measures the script it was started next to.
+
+import os
+
+STAGES = ["scan", "lookup", "useCase", "patch", "write"]
+
+
+class StageTimings(object):
+    def __init__(self):
+        super(StageTimings, self).__init__()
+        self.Times = dict((stage, 0.0) for stage in STAGES)
+        self.RecordCount = 0
+
+    def GetTotal(self):
+        return sum(self.Times.values())
+
+
+def TimeStages(tool, source, replacementDict, targetFileName):
+    """
+    Expand the source and write the result to targetFileName.
+    Returns the StageTimings and the expanded source, which is None if there was nothing to expand.
+    """
+    if os.path.exists(targetFileName):
+        os.remove(targetFileName)
+    stats = tool.Stats.Stats()
+    result, expandedSource = tool.ExpandSourceFile(targetFileName, targetFileName, replacementDict, source, stats)
+    if expandedSource != None:
+        tool.WriteTargetFile(result, None, expandedSource, stats)
+
+    timings = StageTimings()
+    for stage in STAGES:
+        timings.Times[stage] = stats.Stages[stage].Time
+    timings.RecordCount = stats.Records
+    return (timings, expandedSource)
+
+
+def GetBestTimings(timingsList):
+    """
+    Combine repeated runs by taking the fastest time of each stage, this filters out most of the scheduling noise.
+    """
+    best = StageTimings()
+    best.RecordCount = timingsList[0].RecordCount
+    for stage in STAGES:
+        best.Times[stage] = min(timings.Times[stage] for timings in timingsList)
+    return best
@@ -0,0 +1,91 @@
+#***************************************************************************************************************************************************
+#* BSD 3-Clause License
+#*
+#* Copyright (c) 2016, Rene Thrane
+#* All rights reserved.
+#* 
+#* Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#* 
+#* 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#* 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the 
+#*    documentation and/or other materials provided with the distribution.
+#* 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this 
+#*    software without specific prior written permission.
+#* 
+#* THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, 
+#* THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR 
+#* CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, 
+#* PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF 
+#* LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, 
+#* EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#***************************************************************************************************************************************************
+
+# Regression check of the use case classification.
+#
+# The calls are classified again by the original implementation, which searches backwards from every call for the
+# nearest assignment or unmatched bracket of its statement, and compared to the one pass UseCaseClassifier of the tool.
+# The backwards search is quadratic inside long initializer lists, so it's only used here as a reference.
+
+import re
+
+g_classifyTokenPattern = re.compile(r"[(){}\[\];=]")
+
+
+def IsInitializerListBrace(tool, code, reversedCode, braceIndex):
+    match = g_classifyTokenPattern.search(reversedCode, len(reversedCode) - braceIndex)
+    previousToken = match.group() if match else ';'
+    previousTokenEnd = len(reversedCode) - match.start() if match else 0
+    prefix = code[previousTokenEnd:braceIndex].strip()
+    if len(prefix) == 0:
+        return not (previousToken == ')' or previousToken == ';' or previousToken == '{' or previousToken == '}')
+    return tool.g_blockPrefixPattern.search(prefix) == None
+
+
+def IsComparison(reversedCode, reversedIndex):
+    return reversedCode[reversedIndex+1:reversedIndex+2] in ("=", "!", "<", ">") or (reversedIndex > 0 and reversedCode[reversedIndex-1] == '=')
+
+
+def ClassifyUseCase(tool, sourceIndex, code, reversedCode, startIndex):
+    length = len(reversedCode)
+    position = length - startIndex
+    depth = 0
+    while True:
+        match = g_classifyTokenPattern.search(reversedCode, position)
+        if match is None:
+            return tool.UseCase.Unknown
+        position = match.end()
+        token = match.group()
+        if token == ')' or token == ']' or token == '}':
+            depth = depth + 1
+        elif token == '(' or token == '[' or token == '{':
+            if depth > 0:
+                depth = depth - 1
+            elif token == '(':
+                return tool.UseCase.FunctionParameter
+            elif token == '{' and IsInitializerListBrace(tool, code, reversedCode, length - position):
+                return tool.UseCase.ArrayParameter
+            else:
+                return tool.UseCase.Unknown
+        elif depth == 0:
+            if token == ';':
+                return tool.UseCase.Unknown
+            if not IsComparison(reversedCode, match.start()):
+                return tool.DetermineAssignmentType(sourceIndex, length - position - 1)
+
+
+def FindMismatches(tool, source):
+    """
+    Classify all initializer calls of the source with both implementations.
+    Returns a (startIndex, expected, actual) tuple for each call they disagree on.
+    """
+    sourceIndex = tool.SourceIndex(source)
+    records = tool.FindInitializers(source, sourceIndex)
+    tool.ClassifyUseCases(sourceIndex, records)
+    code = sourceIndex.GetCode()
+    reversedCode = code[::-1]
+    mismatches = []
+    for record in records:
+        expected = ClassifyUseCase(tool, sourceIndex, code, reversedCode, record.StartIndex)
+        if record.UseCase != expected:
+            mismatches.append((record.StartIndex, expected, record.UseCase))
+    return mismatches
@@ -0,0 +1,153 @@
+#***************************************************************************************************************************************************
+#* BSD 3-Clause License
+#*
+#* Copyright (c) 2016, Rene Thrane
+#* All rights reserved.
+#* 
+#* Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#* 
+#* 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#* 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the 
+#*    documentation and/or other materials provided with the distribution.
+#* 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this 
+#*    software without specific prior written permission.
+#* 
+#* THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, 
+#* THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR 
+#* CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, 
+#* PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF 
+#* LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, 
+#* EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#***************************************************************************************************************************************************
+
+# Local unix socket transport used by the expansion daemon and its client.
+#
+# Every message is a JSON object encoded as UTF-8 and prefixed with its length as a 32 bit big endian integer.
+# A connection can carry any number of request/response pairs, the client sends a request and waits for the response.
+
+import errno
+import json
+import os
+import socket
+import struct
+
+HEADER = struct.Struct("!I")
+MAX_MESSAGE_SIZE = 512 * 1024 * 1024
+
+
+def IsSupported():
+    return hasattr(socket, "AF_UNIX")
+
+
+def ReceiveExactly(sock, size):
+    chunks = []
+    remaining = size
+    while remaining > 0:
+        chunk = sock.recv(min(remaining, 1024 * 1024))
+        if not chunk:
+            if remaining == size:
+                return None
+            raise IOError("Connection closed in the middle of a message")
+        chunks.append(chunk)
+        remaining = remaining - len(chunk)
+    return b"".join(chunks)
+
+
+def SendMessage(sock, message):
+    data = json.dumps(message).encode("utf-8")
+    sock.sendall(HEADER.pack(len(data)) + data)
+
+
+def ReceiveMessage(sock):
+    """
+    Receive the next message, None is returned if the connection was closed before a new message started.
+    """
+    header = ReceiveExactly(sock, HEADER.size)
+    if header == None:
+        return None
+    size = HEADER.unpack(header)[0]
+    if size > MAX_MESSAGE_SIZE:
+        raise IOError("Message of %s bytes exceeds the maximum size" % (size))
+    data = ReceiveExactly(sock, size) if size > 0 else bytes()
+    if data == None:
+        raise IOError("Connection closed in the middle of a message")
+    return json.loads(data.decode("utf-8"))
+
+
+class DaemonClient(object):
+    def __init__(self, socketPath):
+        super(DaemonClient, self).__init__()
+        if not IsSupported():
+            raise IOError(errno.EAFNOSUPPORT, "Unix sockets are not supported on this platform")
+        self.Socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.Socket.connect(socketPath)
+        except:
+            self.Socket.close()
+            raise
+
+    def Request(self, message):
+        SendMessage(self.Socket, message)
+        response = ReceiveMessage(self.Socket)
+        if response == None:
+            raise IOError("The daemon closed the connection")
+        if "error" in response:
+            raise Exception(response["error"])
+        return response
+
+    def Close(self):
+        self.Socket.close()
+
+
+def IsDaemonRunning(socketPath):
+    try:
+        client = DaemonClient(socketPath)
+    except (IOError, OSError):
+        return False
+    client.Close()
+    return True
+
+
+def Serve(socketPath, requestHandler):
+    """
+    Serve requests on the unix socket until a 'shutdown' request is received.
+    The request handler is called with the request dict and must return the response dict, exceptions are reported
+    back to the client as errors.
+    """
+    import socketserver
+
+    class RequestHandler(socketserver.BaseRequestHandler):
+        def handle(self):
+            while True:
+                request = ReceiveMessage(self.request)
+                if request == None:
+                    return
+                try:
+                    response = requestHandler(request)
+                except (Exception) as ex:
+                    response = {"error": str(ex)}
+                SendMessage(self.request, response)
+                if request.get("command") == "shutdown":
+                    self.server.shutdown()
+                    return
+
+    class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+    if not IsSupported():
+        raise IOError(errno.EAFNOSUPPORT, "Unix sockets are not supported on this platform")
+    if os.path.exists(socketPath):
+        if IsDaemonRunning(socketPath):
+            raise IOError(errno.EADDRINUSE, "A daemon is already listening on '%s'" % (socketPath))
+        # Remove the stale socket left behind by a daemon that did not shut down cleanly
+        os.remove(socketPath)
+
+    server = Server(socketPath, RequestHandler)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        try:
+            os.remove(socketPath)
+        except OSError:
+            pass
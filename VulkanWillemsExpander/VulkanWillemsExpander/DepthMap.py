@@ -0,0 +1,95 @@
+#***************************************************************************************************************************************************
+#* BSD 3-Clause License
+#*
+#* Copyright (c) 2016, Rene Thrane
+#* All rights reserved.
+#* 
+#* Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#* 
+#* 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#* 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the 
+#*    documentation and/or other materials provided with the distribution.
+#* 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this 
+#*    software without specific prior written permission.
+#* 
+#* THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, 
+#* THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR 
+#* CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, 
+#* PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF 
+#* LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, 
+#* EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#***************************************************************************************************************************************************
+
+# Parenthesis depth map of a source, computed with numpy.
+#
+# The depth after every character is a prefix sum over the source, so the closing parenthesis and the top level
+# commas of any call can be found with binary searches instead of walking the parameters one token at a time.
+# The ')' and ',' positions are sorted by (depth, offset) keys, the matching ')' of a '(' at offset p whose depth is d is
+# then the first ')' key at or after (d-1, p) and the top level commas are the ',' keys between (d, p) and (d, end).
+#
+# numpy is optional, IsSupported returns False when it's not installed and the caller has to fall back to a scan.
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+OPEN_PARENTHESIS = ord('(')
+CLOSE_PARENTHESIS = ord(')')
+COMMA = ord(',')
+
+
+def IsSupported():
+    return numpy != None
+
+
+class DepthMap(object):
+    def __init__(self, code):
+        """
+        The code must be the source with comments and literals blanked out, so every '(', ')' and ',' in it is code.
+        """
+        super(DepthMap, self).__init__()
+        # Only the ascii brackets matter, replacing everything else keeps one byte per character so the offsets match
+        data = numpy.frombuffer(code.encode("ascii", "replace"), dtype=numpy.uint8)
+        isClose = data == CLOSE_PARENTHESIS
+        # The depth after each character
+        self.Depth = numpy.cumsum((data == OPEN_PARENTHESIS).astype(numpy.int32) - isClose, dtype=numpy.int64)
+        self.Stride = len(data) + 1
+        closeIndices = numpy.flatnonzero(isClose)
+        self.CloseKeys = numpy.sort(self.Depth[closeIndices] * self.Stride + closeIndices)
+        commaIndices = numpy.flatnonzero(data == COMMA)
+        self.CommaKeys = numpy.sort(self.Depth[commaIndices] * self.Stride + commaIndices)
+
+    def FindCalls(self, openIndices):
+        """
+        Find the matching ')' and the top level parameters of the call of each '(' offset in openIndices.
+        Returns a list with a (closeIndex, spans) tuple for each call, where spans are the (start, end) offsets of the
+        parameters, or None if the '(' is never closed.
+        """
+        if len(openIndices) == 0:
+            return []
+        if len(self.CloseKeys) == 0:
+            return [None] * len(openIndices)
+        stride = self.Stride
+        openIndices = numpy.asarray(openIndices, dtype=numpy.int64)
+        depthKeys = self.Depth[openIndices] * stride
+        closeDepthKeys = depthKeys - stride
+        positions = numpy.searchsorted(self.CloseKeys, closeDepthKeys + openIndices)
+        foundKeys = self.CloseKeys[numpy.minimum(positions, len(self.CloseKeys) - 1)]
+        isFound = (positions < len(self.CloseKeys)) & (foundKeys - closeDepthKeys < stride)
+        closeIndices = numpy.where(isFound, foundKeys - closeDepthKeys, -1)
+        firstCommas = numpy.searchsorted(self.CommaKeys, depthKeys + openIndices, "right")
+        lastCommas = numpy.searchsorted(self.CommaKeys, depthKeys + numpy.maximum(closeIndices, openIndices))
+        # The commas ordered by depth and offset, so the top level commas of a call are a slice
+        commaIndices = (self.CommaKeys % stride).tolist()
+
+        calls = []
+        for openIndex, closeIndex, firstComma, lastComma in zip(openIndices.tolist(), closeIndices.tolist(), firstCommas.tolist(), lastCommas.tolist()):
+            if closeIndex < 0:
+                calls.append(None)
+                continue
+            commas = commaIndices[firstComma:lastComma]
+            starts = [openIndex + 1] + [commaIndex + 1 for commaIndex in commas]
+            commas.append(closeIndex)
+            calls.append((closeIndex, list(zip(starts, commas))))
+        return calls
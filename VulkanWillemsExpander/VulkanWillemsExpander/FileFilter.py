@@ -0,0 +1,176 @@
+#***************************************************************************************************************************************************
+#* BSD 3-Clause License
+#*
+#* Copyright (c) 2016, Rene Thrane
+#* All rights reserved.
+#* 
+#* Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#* 
+#* 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#* 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the 
+#*    documentation and/or other materials provided with the distribution.
+#* 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this 
+#*    software without specific prior written permission.
+#* 
+#* THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, 
+#* THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR 
+#* CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, 
+#* PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF 
+#* LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, 
+#* EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#***************************************************************************************************************************************************
+
+# Include/exclude filtering of the files visited by a recursive run.
+#
+# The filters are globs relative to the root directory of the run. A glob without a '/' matches the name of a file or
+# directory anywhere in the tree, '*' and '?' never match a '/' while '**' matches any number of directories. All the
+# globs of a set are compiled into one regular expression so a path is tested with a single match call. Directories
+# that match a exclude glob are pruned by the walk, so nothing below them is ever listed or read.
+
+import json
+import os
+import re
+from VulkanWillemsExpander import IOUtil
+
+CONFIG_VERSION = 1
+# Loaded from the root directory of a recursive run if no config file is specified
+DEFAULT_CONFIG_FILENAME = ".vulkanwillemsexpander.json"
+
+
+def GlobToRegex(glob):
+    glob = glob.strip().replace("\\", "/").rstrip("/")
+    if glob.startswith("./"):
+        glob = glob[2:]
+    if glob.startswith("/"):
+        regex = ""
+        glob = glob[1:]
+    elif not "/" in glob:
+        regex = "(?:.*/)?"
+    else:
+        regex = ""
+    index = 0
+    while index < len(glob):
+        if glob.startswith("**/", index):
+            regex += "(?:.*/)?"
+            index += 3
+        elif glob.startswith("**", index):
+            regex += ".*"
+            index += 2
+        elif glob[index] == "*":
+            regex += "[^/]*"
+            index += 1
+        elif glob[index] == "?":
+            regex += "[^/]"
+            index += 1
+        elif glob[index] == "[" and glob.find("]", index + 2) > 0:
+            endIndex = glob.find("]", index + 2)
+            content = glob[index+1:endIndex]
+            if content.startswith("!"):
+                content = "^" + content[1:]
+            regex += "[%s]" % content.replace("\\", "\\\\")
+            index = endIndex + 1
+        else:
+            regex += re.escape(glob[index])
+            index += 1
+    return regex
+
+
+def CompileGlobs(globs):
+    """
+    Compile the globs into one pattern, None is returned for a empty list.
+    """
+    if len(globs) == 0:
+        return None
+    return re.compile("|".join("(?:%s)" % GlobToRegex(glob) for glob in globs))
+
+
+class FileFilter(object):
+    def __init__(self, rootDirectory, extensions, includes, excludes, excludedDirectories):
+        """
+        A file must have one of the extensions and match one of the include globs if there are any, excludedDirectories
+        is a set of directory names that are excluded anywhere in the tree.
+        """
+        super(FileFilter, self).__init__()
+        self.RootPrefix = IOUtil.NormalizePath(rootDirectory).rstrip("/") + "/"
+        self.Extensions = tuple(extension.lower() for extension in extensions)
+        self.Includes = list(includes)
+        self.Excludes = list(excludes)
+        self.ExcludedDirectories = excludedDirectories
+        self.IncludePattern = CompileGlobs(self.Includes)
+        self.ExcludePattern = CompileGlobs(self.Excludes)
+
+    def GetRelativePath(self, path):
+        path = IOUtil.ToUnixStylePath(path)
+        if path.startswith(self.RootPrefix):
+            return path[len(self.RootPrefix):]
+        return IOUtil.ToUnixStylePath(os.path.relpath(path, self.RootPrefix))
+
+    def IsExcludedDirectory(self, path):
+        if self.ExcludePattern == None:
+            return False
+        relativePath = self.GetRelativePath(path)
+        # 'directory/**' only matches the directory with a trailing '/'
+        return self.ExcludePattern.fullmatch(relativePath) != None or self.ExcludePattern.fullmatch(relativePath + "/") != None
+
+    def IsIncludedFile(self, path):
+        if not path.lower().endswith(self.Extensions):
+            return False
+        if self.IncludePattern == None and self.ExcludePattern == None:
+            return True
+        relativePath = self.GetRelativePath(path)
+        if self.IncludePattern != None and self.IncludePattern.fullmatch(relativePath) == None:
+            return False
+        return self.ExcludePattern == None or self.ExcludePattern.fullmatch(relativePath) == None
+
+    def FilterPaths(self, paths):
+        """
+        Filter paths that didn't come from the walk, so the excluded directories are checked for every path.
+        Returns the included paths that are below the root directory, in the same form as the paths generated by WalkFiles.
+        """
+        res = []
+        for path in paths:
+            relativePath = self.GetRelativePath(path)
+            if relativePath.startswith("../"):
+                continue
+            directories = relativePath.split("/")[:-1]
+            isExcluded = False
+            for index in range(len(directories)):
+                if directories[index] in self.ExcludedDirectories or self.IsExcludedDirectory(self.RootPrefix + "/".join(directories[:index+1])):
+                    isExcluded = True
+                    break
+            if not isExcluded and self.IsIncludedFile(self.RootPrefix + relativePath):
+                res.append(self.RootPrefix + relativePath)
+        return res
+
+    def WalkFiles(self):
+        """
+        Generate the paths of the included files, excluded directories are pruned.
+        """
+        rootDirectory = self.RootPrefix[:-1] if len(self.RootPrefix) > 1 else self.RootPrefix
+        isExcludedDirectory = self.IsExcludedDirectory if self.ExcludePattern != None else None
+        for currentDirectory, fileEntries in IOUtil.WalkTree(rootDirectory, self.ExcludedDirectories, isExcludedDirectory):
+            for entry in fileEntries:
+                path = IOUtil.ToUnixStylePath(entry.path)
+                if self.IsIncludedFile(path):
+                    yield path
+
+
+def LoadConfig(filename):
+    """
+    Load a config file, a json object with optional "include", "exclude" and "excludeDirectories" lists.
+    Returns a (includes, excludes, excludedDirectories) tuple.
+    """
+    with open(filename, "r") as theFile:
+        try:
+            content = json.load(theFile)
+        except ValueError as ex:
+            raise Exception("Invalid config file '%s': %s" % (filename, ex))
+    if not isinstance(content, dict) or content.get("version", CONFIG_VERSION) != CONFIG_VERSION:
+        raise Exception("Invalid config file '%s': expected a version %s json object" % (filename, CONFIG_VERSION))
+    res = []
+    for key in ["include", "exclude", "excludeDirectories"]:
+        value = content.get(key, [])
+        if not isinstance(value, list) or not all(isinstance(entry, str) for entry in value):
+            raise Exception("Invalid config file '%s': '%s' must be a list of strings" % (filename, key))
+        res.append(value)
+    return tuple(res)
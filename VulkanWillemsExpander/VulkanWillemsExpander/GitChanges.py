@@ -0,0 +1,59 @@
+#***************************************************************************************************************************************************
+#* BSD 3-Clause License
+#*
+#* Copyright (c) 2016, Rene Thrane
+#* All rights reserved.
+#* 
+#* Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#* 
+#* 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#* 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the 
+#*    documentation and/or other materials provided with the distribution.
+#* 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this 
+#*    software without specific prior written permission.
+#* 
+#* THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, 
+#* THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR 
+#* CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, 
+#* PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF 
+#* LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, 
+#* EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#***************************************************************************************************************************************************
+
+# Asks the local git repository which files changed, used by the --since mode to only process the changed files.
+
+import os
+import subprocess
+from VulkanWillemsExpander import IOUtil
+
+
+def RunGit(directory, arguments):
+    """
+    Run git in the directory and return its output, None is returned if git is not installed or the command failed.
+    """
+    try:
+        return subprocess.check_output(["git", "-C", directory] + arguments, stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def SplitPaths(output):
+    return [os.fsdecode(path) for path in output.split(b"\0") if len(path) > 0]
+
+
+def TryGetChangedFiles(directory, ref):
+    """
+    Get the files below the directory that differ from ref in the working tree (staged or not) plus the untracked files
+    that are not ignored, deleted files are left out.
+    Git reports the paths relative to the directory, so they are joined with the directory as given instead of the
+    resolved repository root, which would not match the directory if it's reached through a symlink.
+    Returns a sorted list of paths or None if the directory is not in a git repository or the ref is unknown.
+    """
+    changedFiles = RunGit(directory, ["diff", "--name-only", "-z", "--relative", "--no-renames", "--diff-filter=d", ref, "--", "."])
+    if changedFiles == None:
+        return None
+    untrackedFiles = RunGit(directory, ["ls-files", "-z", "--others", "--exclude-standard", "--", "."])
+    if untrackedFiles == None:
+        return None
+    paths = set(SplitPaths(changedFiles) + SplitPaths(untrackedFiles))
+    return sorted(IOUtil.Join(directory, path) for path in paths)
@@ -32,11 +32,17 @@
 #****************************************************************************************************************************************************
 
 import errno
+import locale
+import mmap
 import sys
 import os
 import stat
+import tempfile
 import os.path
 
+# The size of the blocks read by FileContentEquals
+COMPARE_CHUNK_SIZE = 64 * 1024
+
 def ReadFile(filename):
     content = None
     with open(filename, "r") as theFile:
@@ -56,15 +62,48 @@ def WriteFile(filename, content):
         theFile.write(content)
 
 
+def DecodeText(content):
+    """
+    Decode binary file content to the same string ReadFile would have returned for the file.
+    """
+    content = content.decode(locale.getpreferredencoding(False))
+    if "\r" in content:
+        content = content.replace("\r\n", "\n").replace("\r", "\n")
+    return content
+
+
+def EncodeText(content):
+    """
+    Encode the content to the bytes WriteFile would write to the file.
+    """
+    if os.linesep != "\n":
+        content = content.replace("\n", os.linesep)
+    return content.encode(locale.getpreferredencoding(False))
+
+
+def TryGetFileSize(filename):
+    """
+    Get the size of the file, None is returned if it doesn't exist.
+    """
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+    if not stat.S_ISREG(st.st_mode):
+        raise IOError("'%s' exist but it's not a file" % (filename))
+    return st.st_size
+
+
 def WriteFileIfChanged(filename, content):
-    existingContent = None
-    if os.path.exists(filename):
-        if os.path.isfile(filename):
-            existingContent = ReadFile(filename)
-        else:
-            raise IOError("'%s' exist but it's not a file" % (filename))
-    if content != existingContent:
-        WriteFile(filename, content)
+    """
+    Write the content unless the file already contains it, see WriteBinaryFileIfChanged.
+    Returns True if the file was written.
+    """
+    return WriteBinaryFileIfChanged(filename, EncodeText(content))
+
+
+def WriteFileAtomic(filename, content):
+    WriteBinaryFileAtomic(filename, EncodeText(content))
 
 
 def ReadBinaryFile(filename):
@@ -74,6 +113,30 @@ def ReadBinaryFile(filename):
     return content
 
 
+def ReadBinaryFileIfMatching(filename, requiredTokens, rejectedTokens):
+    """
+    Memory map the file and search it for the byte strings, the content is only copied into memory
+    if all of the required tokens and none of the rejected tokens are present.
+    Returns the content or None if the file was rejected.
+    """
+    with open(filename, "rb") as theFile:
+        try:
+            mappedFile = mmap.mmap(theFile.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files can't be mapped
+            return None if len(requiredTokens) > 0 else bytes()
+        try:
+            for token in requiredTokens:
+                if mappedFile.find(token) < 0:
+                    return None
+            for token in rejectedTokens:
+                if mappedFile.find(token) >= 0:
+                    return None
+            return mappedFile[:]
+        finally:
+            mappedFile.close()
+
+
 def TryReadBinaryFile(filename):
     try:
         return ReadBinaryFile(filename)
@@ -86,15 +149,94 @@ def WriteBinaryFile(filename, content):
         theFile.write(content)
 
 
+def FileContentEquals(filename, content):
+    """
+    Compare the file with the binary content, the file is read in blocks and the compare stops at the first difference.
+    """
+    view = memoryview(content)
+    offset = 0
+    with open(filename, "rb") as theFile:
+        while offset < len(view):
+            block = theFile.read(COMPARE_CHUNK_SIZE)
+            if len(block) == 0 or view[offset:offset+len(block)] != block:
+                return False
+            offset = offset + len(block)
+        return len(theFile.read(1)) == 0
+
+
+def GetDefaultFileMode():
+    """
+    The mode open() would give a new file, the temporary files of WriteBinaryFileAtomic are only accessible by the owner.
+    """
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+def WriteBinaryFileAtomic(filename, content):
+    """
+    Write the content to a temporary file next to the file and move it into place, so a interrupted write never leaves
+    a half written file behind. The mode of a existing file is preserved and symlinks are written through.
+    """
+    if os.path.islink(filename):
+        filename = os.path.realpath(filename)
+    try:
+        mode = stat.S_IMODE(os.stat(filename).st_mode)
+    except OSError:
+        mode = GetDefaultFileMode()
+    else:
+        # The rename only needs a writable directory, so a read only file has to be refused like open() would
+        if not os.access(filename, os.W_OK):
+            raise IOError(errno.EACCES, os.strerror(errno.EACCES), filename)
+    fileHandle, tempFilename = tempfile.mkstemp(prefix=".%s." % os.path.basename(filename), suffix=".tmp", dir=os.path.dirname(os.path.abspath(filename)))
+    try:
+        with os.fdopen(fileHandle, "wb") as theFile:
+            theFile.write(content)
+        os.chmod(tempFilename, mode)
+        os.replace(tempFilename, filename)
+    except:
+        RemoveFile(tempFilename)
+        raise
+
+
 def WriteBinaryFileIfChanged(filename, content):
-    existingContent = None
-    if os.path.exists(filename):
-        if os.path.isfile(filename):
-            existingContent = ReadBinaryFile(filename)
-        else:
-            raise IOError("'%s' exist but it's not a file" % (filename))
-    if content != existingContent:
-        WriteBinaryFile(filename, content)
+    """
+    Write the content unless the file already contains it. The existing file is only compared if its size matches and
+    changed content is written with WriteBinaryFileAtomic.
+    Returns True if the file was written.
+    """
+    existingSize = TryGetFileSize(filename)
+    if existingSize == len(content) and FileContentEquals(filename, content):
+        return False
+    WriteBinaryFileAtomic(filename, content)
+    return True
+
+
+def SyncFiles(filenames):
+    """
+    Flush the files and the directories containing them to disk, the directories have to be flushed as well for the
+    renames done by WriteBinaryFileAtomic to be durable.
+    """
+    directories = set()
+    for filename in filenames:
+        fileHandle = os.open(filename, os.O_RDONLY)
+        try:
+            os.fsync(fileHandle)
+        finally:
+            os.close(fileHandle)
+        directories.add(os.path.dirname(os.path.abspath(filename)))
+    for directory in sorted(directories):
+        try:
+            fileHandle = os.open(directory, os.O_RDONLY)
+        except OSError:
+            # Directories can't be opened on all platforms
+            continue
+        try:
+            os.fsync(fileHandle)
+        except OSError:
+            pass
+        finally:
+            os.close(fileHandle)
 
 
 def SetFileExecutable(filename):
@@ -215,6 +357,37 @@ def GetFilePaths(directory, filter):
     return file_paths
 
 
+def WalkTree(directory, excludedDirectories=None, isExcludedDirectory=None):
+    """
+    Walk the tree top-down with os.scandir and generate a (directoryPath, fileEntries) tuple for every directory, the
+    file entries are the os.DirEntry objects of the files in it. Directories whose name is in excludedDirectories or
+    whose path is accepted by isExcludedDirectory are never entered, symlinked directories are not followed and
+    directories that can't be read are skipped.
+    """
+    pendingDirectories = [directory]
+    while len(pendingDirectories) > 0:
+        currentDirectory = pendingDirectories.pop()
+        fileEntries = []
+        subDirectories = []
+        try:
+            with os.scandir(currentDirectory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir():
+                            if not entry.is_symlink() and (excludedDirectories == None or not entry.name in excludedDirectories):
+                                if isExcludedDirectory == None or not isExcludedDirectory(ToUnixStylePath(entry.path)):
+                                    subDirectories.append(entry.path)
+                        elif entry.is_file():
+                            fileEntries.append(entry)
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+        yield (currentDirectory, fileEntries)
+        # Reversed so the directories are visited in the order they were listed
+        pendingDirectories.extend(reversed(subDirectories))
+
+
 def GetFilesAt(directory, absolutePaths):
     if absolutePaths:
         return [ Join(directory,f) for f in os.listdir(directory) if os.path.isfile(os.path.join(directory,f)) ]
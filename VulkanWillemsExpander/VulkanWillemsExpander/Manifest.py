@@ -0,0 +1,153 @@
+#***************************************************************************************************************************************************
+#* BSD 3-Clause License
+#*
+#* Copyright (c) 2016, Rene Thrane
+#* All rights reserved.
+#* 
+#* Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#* 
+#* 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#* 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the 
+#*    documentation and/or other materials provided with the distribution.
+#* 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this 
+#*    software without specific prior written permission.
+#* 
+#* THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, 
+#* THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR 
+#* CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, 
+#* PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF 
+#* LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, 
+#* EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#***************************************************************************************************************************************************
+
+# Persistent record of the files seen by a recursive run, it allows unchanged files to be skipped on the next run
+# without reading them.
+#
+# A file is considered unchanged when its size and modification time match the recorded values and the target file
+# (if any) is also untouched. If only the modification time changed the content hash is used to detect touched files.
+# The manifest is discarded when the fingerprint changes, this happens when the method tables or the options change.
+
+import json
+import os
+from VulkanWillemsExpander import IOUtil
+
+MANIFEST_VERSION = 1
+
+
+def TryGetFileStat(filename):
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+    return (st.st_size, st.st_mtime_ns)
+
+
+class ManifestEntry(object):
+    def __init__(self, fileStat, contentHash, targetFileName, targetStat):
+        super(ManifestEntry, self).__init__()
+        self.FileStat = fileStat
+        self.ContentHash = contentHash
+        self.TargetFileName = targetFileName
+        self.TargetStat = targetStat
+
+    def IsTargetUnchanged(self):
+        return self.TargetFileName == None or TryGetFileStat(self.TargetFileName) == self.TargetStat
+
+    def ToDict(self):
+        return {
+            "stat": list(self.FileStat),
+            "hash": self.ContentHash,
+            "target": self.TargetFileName,
+            "targetStat": list(self.TargetStat) if self.TargetStat != None else None,
+        }
+
+    @staticmethod
+    def FromDict(value):
+        targetStat = value["targetStat"]
+        return ManifestEntry(tuple(value["stat"]), value["hash"], value["target"], tuple(targetStat) if targetStat != None else None)
+
+
+class Manifest(object):
+    def __init__(self, fingerprint):
+        super(Manifest, self).__init__()
+        self.Fingerprint = fingerprint
+        self.Entries = {}
+        self.IsDirty = False
+
+    @staticmethod
+    def Load(filename, fingerprint):
+        """
+        Load the manifest, a empty manifest is returned if the file does not exist, can't be parsed or was written with a different fingerprint.
+        """
+        manifest = Manifest(fingerprint)
+        try:
+            with open(filename, "r") as theFile:
+                content = json.load(theFile)
+            if content.get("version") == MANIFEST_VERSION and content.get("fingerprint") == fingerprint:
+                manifest.Entries = dict((key, ManifestEntry.FromDict(value)) for key, value in content["files"].items())
+        except (IOError, ValueError, KeyError, TypeError):
+            manifest.Entries = {}
+        return manifest
+
+    def Save(self, filename):
+        if not self.IsDirty:
+            return
+        content = {
+            "version": MANIFEST_VERSION,
+            "fingerprint": self.Fingerprint,
+            "files": dict((key, entry.ToDict()) for key, entry in self.Entries.items()),
+        }
+        IOUtil.WriteFileAtomic(filename, json.dumps(content, indent=1, sort_keys=True))
+        self.IsDirty = False
+
+    def IsUnchanged(self, filename):
+        """
+        Check if the file and its target still match the manifest, this only stats the files.
+        """
+        entry = self.Entries.get(os.path.abspath(filename))
+        if entry == None or TryGetFileStat(filename) != entry.FileStat:
+            return False
+        return entry.IsTargetUnchanged()
+
+    def TryGetContentHash(self, filename):
+        """
+        Get the recorded content hash of a file whose target is untouched, the caller can compare it against the
+        current content to detect files that were touched but not modified.
+        """
+        entry = self.Entries.get(os.path.abspath(filename))
+        if entry == None or not entry.IsTargetUnchanged():
+            return None
+        return entry.ContentHash
+
+    def Update(self, filename, contentHash, targetFileName):
+        fileStat = TryGetFileStat(filename)
+        if fileStat == None:
+            self.Remove(filename)
+            return
+        targetStat = None
+        if targetFileName != None:
+            if os.path.abspath(targetFileName) == os.path.abspath(filename):
+                # The source might have been rewritten so the hash of the content we read is no longer valid
+                contentHash = None
+                targetFileName = None
+            else:
+                targetFileName = os.path.abspath(targetFileName)
+                targetStat = TryGetFileStat(targetFileName)
+        self.Entries[os.path.abspath(filename)] = ManifestEntry(fileStat, contentHash, targetFileName, targetStat)
+        self.IsDirty = True
+
+    def UpdateFileStat(self, filename):
+        """
+        Record the current stat of a file whose content was found to be identical to the recorded content.
+        """
+        entry = self.Entries.get(os.path.abspath(filename))
+        fileStat = TryGetFileStat(filename)
+        if entry == None or fileStat == None:
+            self.Remove(filename)
+            return
+        entry.FileStat = fileStat
+        self.IsDirty = True
+
+    def Remove(self, filename):
+        if self.Entries.pop(os.path.abspath(filename), None) != None:
+            self.IsDirty = True
@@ -0,0 +1,113 @@
+#***************************************************************************************************************************************************
+#* BSD 3-Clause License
+#*
+#* Copyright (c) 2016, Rene Thrane
+#* All rights reserved.
+#* 
+#* Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#* 
+#* 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#* 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the 
+#*    documentation and/or other materials provided with the distribution.
+#* 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this 
+#*    software without specific prior written permission.
+#* 
+#* THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, 
+#* THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR 
+#* CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, 
+#* PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF 
+#* LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, 
+#* EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#***************************************************************************************************************************************************
+
+# Method tables defined in a external json file.
+#
+#   {
+#     "version": 1,
+#     "ignore": ["pushConstantRange"],
+#     "methods": [
+#       {"name": "viewport", "parameterCount": 4, "expansion": [["width", "#0"], ["height", "#1"], ...]},
+#       ...
+#     ]
+#   }
+#
+# Validating and compiling a large table is the expensive part of loading it, so the validated methods are stored in a
+# pickled cache next to the table. The cache is keyed by the content hash of the table, the python version and the
+# template version of the MethodInfo, so editing the table, switching interpreter or a MethodInfo that compiles its
+# templates differently simply rebuilds it.
+
+import hashlib
+import json
+import sys
+from VulkanWillemsExpander import PickleCache
+
+METHOD_TABLE_VERSION = 1
+CACHE_VERSION = 2
+
+
+def GetCacheFileName(filename):
+    return "%s.cache" % filename
+
+
+def GetCacheKey(content, templateVersion):
+    return "%s:%s:%s:%s" % (CACHE_VERSION, templateVersion, sys.version, hashlib.sha1(content).hexdigest())
+
+
+def ParseMethodTable(filename, content):
+    """
+    Parse the json method table.
+    Returns a (methods, ignoreMethods) tuple where methods is a list of (name, parameterCount, expansionParameters) tuples.
+    """
+    try:
+        table = json.loads(content.decode("utf-8"))
+        if table.get("version") != METHOD_TABLE_VERSION:
+            raise Exception("Unsupported version '%s'" % (table.get("version")))
+        methods = []
+        for entry in table["methods"]:
+            expansionParameters = [(str(param[0]), str(param[1])) for param in entry["expansion"]]
+            methods.append((str(entry["name"]), int(entry["parameterCount"]), expansionParameters))
+        ignoreMethods = [str(name) for name in table.get("ignore", [])]
+    except (ValueError, KeyError, TypeError, IndexError, AttributeError) as ex:
+        raise Exception("Invalid method table '%s': %s" % (filename, ex))
+    return (methods, ignoreMethods)
+
+
+def Load(filename, createMethodInfo, templateVersion):
+    """
+    Load the method table, createMethodInfo(name, parameterCount, expansionParameters, renderTemplate=None) is used to
+    create and validate each method. Methods restored from the cache are passed their compiled render template, the
+    templateVersion identifies the template format so a cache written for a different one is not used.
+    Returns a (methods, ignoreMethods) tuple.
+    """
+    with open(filename, "rb") as theFile:
+        content = theFile.read()
+    cacheFileName = GetCacheFileName(filename)
+    cacheKey = GetCacheKey(content, templateVersion)
+    cached = PickleCache.TryLoad(cacheFileName, cacheKey)
+    if cached != None:
+        compiledMethods, ignoreMethods = cached
+        return ([createMethodInfo(name, parameterCount, expansionParameters, renderTemplate) for name, parameterCount, expansionParameters, renderTemplate in compiledMethods], set(ignoreMethods))
+
+    parsedMethods, ignoreMethods = ParseMethodTable(filename, content)
+    methods = []
+    for name, parameterCount, expansionParameters in parsedMethods:
+        try:
+            methods.append(createMethodInfo(name, parameterCount, expansionParameters))
+        except (Exception) as ex:
+            raise Exception("Invalid method '%s' with %s parameters in method table '%s': %s" % (name, parameterCount, filename, ex))
+    compiledMethods = [(entry.Name, entry.ParameterCount, entry.ExpansionParameters, entry.RenderTemplate) for entry in methods]
+    PickleCache.TrySave(cacheFileName, cacheKey, (compiledMethods, ignoreMethods))
+    return (methods, set(ignoreMethods))
+
+
+def Save(filename, methods, ignoreMethods):
+    """
+    Write the methods to a method table file, this can be used to export the built in tables as a starting point.
+    """
+    table = {
+        "version": METHOD_TABLE_VERSION,
+        "ignore": sorted(ignoreMethods),
+        "methods": [{"name": entry.Name, "parameterCount": entry.ParameterCount, "expansion": [list(param) for param in entry.ExpansionParameters]} for entry in methods],
+    }
+    with open(filename, "w") as theFile:
+        json.dump(table, theFile, indent=1)
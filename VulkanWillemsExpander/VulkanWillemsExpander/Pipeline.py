@@ -0,0 +1,111 @@
+#***************************************************************************************************************************************************
+#* BSD 3-Clause License
+#*
+#* Copyright (c) 2016, Rene Thrane
+#* All rights reserved.
+#* 
+#* Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#* 
+#* 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#* 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the 
+#*    documentation and/or other materials provided with the distribution.
+#* 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this 
+#*    software without specific prior written permission.
+#* 
+#* THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, 
+#* THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR 
+#* CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, 
+#* PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF 
+#* LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, 
+#* EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#***************************************************************************************************************************************************
+
+# Staged pipeline for the file jobs of a recursive run.
+#
+# Every item passes through a list of stages, each stage runs on its own executor so a item can be read while the
+# previous one is expanded and the one before that is written. A typical setup is a thread pool that reads the files,
+# a process pool (or a single thread) that runs the expansion and a single writer thread. The number of items in
+# flight is bounded, which bounds the memory held by file contents waiting for the next stage.
+
+import collections
+import concurrent.futures
+
+
+def SetFutureResult(future, result):
+    try:
+        future.set_result(result)
+    except concurrent.futures.InvalidStateError:
+        # Cancelled by a consumer that stopped early
+        pass
+
+
+def SetFutureException(future, exception):
+    try:
+        future.set_exception(exception)
+    except concurrent.futures.InvalidStateError:
+        pass
+
+
+class Stage(object):
+    def __init__(self, executor, function):
+        """
+        The function is called with the item and returns the item for the next stage, it's executed on the executor.
+        """
+        super(Stage, self).__init__()
+        self.Executor = executor
+        self.Function = function
+
+
+class Pipeline(object):
+    def __init__(self, stages, maxInFlight, isDone=None):
+        """
+        Items for which isDone(item) returns True skip the remaining stages.
+        """
+        super(Pipeline, self).__init__()
+        self.Stages = stages
+        self.MaxInFlight = max(1, maxInFlight)
+        self.IsDone = isDone
+
+    def __RunStage(self, stageIndex, item, done):
+        if done.cancelled():
+            return
+        if stageIndex >= len(self.Stages) or (self.IsDone != None and self.IsDone(item)):
+            SetFutureResult(done, item)
+            return
+        stage = self.Stages[stageIndex]
+        try:
+            future = stage.Executor.submit(stage.Function, item)
+        except Exception as ex:
+            # The executors are shut down
+            SetFutureException(done, ex)
+            return
+        future.add_done_callback(lambda future: self.__OnStageDone(stageIndex, future, done))
+
+    def __OnStageDone(self, stageIndex, future, done):
+        if future.cancelled():
+            done.cancel()
+            return
+        exception = future.exception()
+        if exception != None:
+            SetFutureException(done, exception)
+            return
+        self.__RunStage(stageIndex + 1, future.result(), done)
+
+    def Run(self, items):
+        """
+        Generate the items that passed through all stages, in the same order as they were supplied.
+        The items are consumed lazily so no more than maxInFlight items are ever between the first and the last stage.
+        """
+        pending = collections.deque()
+        try:
+            for item in items:
+                done = concurrent.futures.Future()
+                pending.append(done)
+                self.__RunStage(0, item, done)
+                if len(pending) >= self.MaxInFlight:
+                    yield pending.popleft().result()
+            while len(pending) > 0:
+                yield pending.popleft().result()
+        finally:
+            for done in pending:
+                done.cancel()
@@ -0,0 +1,92 @@
+#***************************************************************************************************************************************************
+#* BSD 3-Clause License
+#*
+#* Copyright (c) 2016, Rene Thrane
+#* All rights reserved.
+#* 
+#* Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#* 
+#* 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#* 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the 
+#*    documentation and/or other materials provided with the distribution.
+#* 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this 
+#*    software without specific prior written permission.
+#* 
+#* THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, 
+#* THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR 
+#* CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, 
+#* PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF 
+#* LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, 
+#* EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#***************************************************************************************************************************************************
+
+# Compact storage for the initializer calls found in a source.
+#
+# The table stores the calls as columns of typed arrays instead of a object per call, the parameters are kept as spans
+# into the source and the method names are stored once and referenced by id. This keeps large sources and the
+# results of the worker processes small, as a table pickles to a few flat buffers.
+
+from array import array
+
+
+class RecordTable(object):
+    def __init__(self):
+        super(RecordTable, self).__init__()
+        self.StartIndices = array('q')
+        self.EndIndices = array('q')
+        self.MethodIds = array('l')
+        self.UseCases = array('b')
+        self.ParameterCounts = array('l')
+        # The spans of record i are stored as start, end pairs in Spans[SpanOffsets[i]:SpanOffsets[i+1]]
+        self.SpanOffsets = array('q', [0])
+        self.Spans = array('q')
+        self.MethodNames = []
+        self.MethodIdDict = {}
+
+    def __len__(self):
+        return len(self.StartIndices)
+
+    def GetMethodId(self, name):
+        methodId = self.MethodIdDict.get(name)
+        if methodId == None:
+            methodId = len(self.MethodNames)
+            self.MethodNames.append(name)
+            self.MethodIdDict[name] = methodId
+        return methodId
+
+    def Append(self, startIndex, endIndex, name, spans, parameterCount, useCase):
+        self.StartIndices.append(startIndex)
+        self.EndIndices.append(endIndex)
+        self.MethodIds.append(self.GetMethodId(name))
+        self.UseCases.append(useCase)
+        self.ParameterCounts.append(parameterCount)
+        for start, end in spans:
+            self.Spans.append(start)
+            self.Spans.append(end)
+        self.SpanOffsets.append(len(self.Spans))
+
+    def GetName(self, index):
+        return self.MethodNames[self.MethodIds[index]]
+
+    def GetSpans(self, index):
+        spans = self.Spans[self.SpanOffsets[index]:self.SpanOffsets[index+1]]
+        return list(zip(spans[0::2], spans[1::2]))
+
+    def CountMethods(self):
+        """
+        Returns a list with the number of records of each method id.
+        """
+        counts = [0] * len(self.MethodNames)
+        for methodId in self.MethodIds:
+            counts[methodId] += 1
+        return counts
+
+    def __getstate__(self):
+        # The id dict is rebuilt from the names
+        state = self.__dict__.copy()
+        del state["MethodIdDict"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.MethodIdDict = dict((name, methodId) for methodId, name in enumerate(self.MethodNames))
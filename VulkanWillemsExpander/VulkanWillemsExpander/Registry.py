@@ -0,0 +1,164 @@
+#***************************************************************************************************************************************************
+#* BSD 3-Clause License
+#*
+#* Copyright (c) 2016, Rene Thrane
+#* All rights reserved.
+#* 
+#* Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#* 
+#* 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#* 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the 
+#*    documentation and/or other materials provided with the distribution.
+#* 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this 
+#*    software without specific prior written permission.
+#* 
+#* THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, 
+#* THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR 
+#* CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, 
+#* PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF 
+#* LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, 
+#* EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#***************************************************************************************************************************************************
+
+# Struct index of the Vulkan registry (vk.xml).
+#
+# The registry is several megabytes of xml, so it's parsed once into a compact index that is stored next to it as
+# vk.xml.index. The index maps each struct name to a (structureType, members) tuple where structureType is the
+# VK_STRUCTURE_TYPE_* value of its sType member (or None) and members is a tuple of (name, typeName) tuples.
+# The stored index is keyed by the size and modification time of the registry so it's loaded without touching the xml.
+
+import os
+import sys
+import xml.etree.ElementTree as ElementTree
+from VulkanWillemsExpander import PickleCache
+
+REGISTRY_INDEX_VERSION = 1
+
+
+def GetIndexFileName(filename):
+    return "%s.index" % filename
+
+
+def GetIndexKey(filename):
+    st = os.stat(filename)
+    return "%s:%s:%s:%s" % (REGISTRY_INDEX_VERSION, sys.version, st.st_size, st.st_mtime_ns)
+
+
+def ParseRegistry(filename):
+    """
+    Parse the struct and union definitions of the registry into a index.
+    """
+    index = {}
+    aliases = {}
+    for event, element in ElementTree.iterparse(filename):
+        # <type> is also used for the member types, those have no category
+        if element.tag != "type" or not element.get("category") in ("struct", "union"):
+            continue
+        name = element.get("name")
+        alias = element.get("alias")
+        if alias != None:
+            aliases[name] = alias
+        else:
+            structureType = None
+            members = []
+            for member in element.iter("member"):
+                memberName = member.findtext("name")
+                memberType = member.findtext("type")
+                if memberName == "sType" and member.get("values") != None:
+                    structureType = member.get("values")
+                members.append((memberName, memberType))
+            index[name] = (structureType, tuple(members))
+        element.clear()
+    for name, alias in aliases.items():
+        if alias in index:
+            index[name] = index[alias]
+    return index
+
+
+def LoadRegistryIndex(filename):
+    """
+    Load the index of the registry, it's parsed and stored next to the registry if the stored index is missing or outdated.
+    """
+    indexFileName = GetIndexFileName(filename)
+    indexKey = GetIndexKey(filename)
+    index = PickleCache.TryLoad(indexFileName, indexKey)
+    if index == None:
+        index = ParseRegistry(filename)
+        PickleCache.TrySave(indexFileName, indexKey, index)
+    return index
+
+
+def GetStructName(methodName):
+    return "Vk%s%s" % (methodName[:1].upper(), methodName[1:])
+
+
+def GetMethodName(structName):
+    name = structName[2:] if structName.startswith("Vk") else structName
+    return "%s%s" % (name[:1].lower(), name[1:])
+
+
+def GetDefaultParameters(index, structName):
+    """
+    Get the sType and pNext defaults of the struct as expansion parameters.
+    """
+    entry = index.get(structName)
+    if entry == None or entry[0] == None:
+        return []
+    defaults = [("sType", entry[0])]
+    if any(memberName == "pNext" for memberName, memberType in entry[1]):
+        defaults.append(("pNext", "nullptr"))
+    return defaults
+
+
+def FindMemberType(index, structName, fieldName):
+    """
+    Find the type of a possibly nested field like 'offset.x', returns None if the struct has no such field.
+    """
+    typeName = structName
+    for name in fieldName.split("."):
+        entry = index.get(typeName)
+        if entry == None:
+            return None
+        typeName = None
+        for memberName, memberType in entry[1]:
+            if memberName == name:
+                typeName = memberType
+                break
+        if typeName == None:
+            return None
+    return typeName
+
+
+def ValidateMethod(index, name, expansionParameters):
+    """
+    Validate the fields and the sType value of a method against the registry.
+    Returns a list of warnings.
+    """
+    structName = GetStructName(name)
+    entry = index.get(structName)
+    if entry == None:
+        return ["WARNING: Method '%s' has no matching struct '%s' in the registry" % (name, structName)]
+    warnings = []
+    for fieldName, value in expansionParameters:
+        if FindMemberType(index, structName, fieldName) == None:
+            warnings.append("WARNING: Method '%s' sets unknown field '%s' of '%s'" % (name, fieldName, structName))
+        elif fieldName == "sType" and entry[0] != None and value != entry[0]:
+            warnings.append("WARNING: Method '%s' sets sType to '%s' but '%s' expects '%s'" % (name, value, structName, entry[0]))
+    return warnings
+
+
+def GenerateDefaultMethods(index, existingMethods):
+    """
+    Generate a parameterless method setting the sType and pNext defaults for every struct with a structure type
+    that does not already have one in existingMethods, a set of (name, parameterCount) tuples.
+    Returns a list of (name, parameterCount, expansionParameters) tuples sorted by name.
+    """
+    methods = []
+    for structName in sorted(index.keys()):
+        name = GetMethodName(structName)
+        if (name, 0) in existingMethods:
+            continue
+        defaults = GetDefaultParameters(index, structName)
+        if len(defaults) > 0:
+            methods.append((name, 0, defaults))
+    return methods
@@ -0,0 +1,143 @@
+#***************************************************************************************************************************************************
+#* BSD 3-Clause License
+#*
+#* Copyright (c) 2016, Rene Thrane
+#* All rights reserved.
+#* 
+#* Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#* 
+#* 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#* 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the 
+#*    documentation and/or other materials provided with the distribution.
+#* 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this 
+#*    software without specific prior written permission.
+#* 
+#* THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, 
+#* THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR 
+#* CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, 
+#* PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF 
+#* LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, 
+#* EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#***************************************************************************************************************************************************
+
+# Per stage instrumentation of a run.
+#
+# Every stage records the wall time spent in it and the number of files and bytes that passed through it. When
+# running with multiple jobs each worker collects its own Stats which are merged by the main process, so the stage
+# times are summed over all jobs while the total time is the wall time of the run.
+
+import json
+import sys
+import time
+
+STAGES = ["walk", "prefilter", "scan", "lookup", "useCase", "patch", "write"]
+
+
+class StageStats(object):
+    def __init__(self):
+        super(StageStats, self).__init__()
+        self.Time = 0.0
+        self.Files = 0
+        self.Bytes = 0
+
+
+class Stats(object):
+    IsEnabled = True
+
+    def __init__(self):
+        super(Stats, self).__init__()
+        self.StartTime = time.perf_counter()
+        self.Stages = dict((stage, StageStats()) for stage in STAGES)
+        self.TotalTime = 0.0
+        self.Records = 0
+        self.Unmatched = 0
+        self.Written = 0
+        self.WritesSkipped = 0
+
+    def Clock(self):
+        return time.perf_counter()
+
+    def Stop(self):
+        self.TotalTime = time.perf_counter() - self.StartTime
+
+    def AddStage(self, stage, startTime, fileCount=1, byteCount=0):
+        """
+        Add the time since startTime to the stage and return the current clock so it can be used to time the next stage.
+        """
+        now = time.perf_counter()
+        stageStats = self.Stages[stage]
+        stageStats.Time += now - startTime
+        stageStats.Files += fileCount
+        stageStats.Bytes += byteCount
+        return now
+
+    def AddRecords(self, recordCount, unmatchedCount):
+        self.Records += recordCount
+        self.Unmatched += unmatchedCount
+
+    def AddWrite(self, written):
+        if written:
+            self.Written += 1
+        else:
+            self.WritesSkipped += 1
+
+    def Merge(self, other):
+        for stage in STAGES:
+            stageStats = self.Stages[stage]
+            otherStats = other.Stages[stage]
+            stageStats.Time += otherStats.Time
+            stageStats.Files += otherStats.Files
+            stageStats.Bytes += otherStats.Bytes
+        self.Records += other.Records
+        self.Unmatched += other.Unmatched
+        self.Written += other.Written
+        self.WritesSkipped += other.WritesSkipped
+
+    def ToDict(self):
+        return {
+            "stages": dict((stage, {"time": self.Stages[stage].Time, "files": self.Stages[stage].Files, "bytes": self.Stages[stage].Bytes}) for stage in STAGES),
+            "totalTime": self.TotalTime,
+            "records": self.Records,
+            "unmatched": self.Unmatched,
+            "written": self.Written,
+            "writesSkipped": self.WritesSkipped,
+        }
+
+    def Save(self, filename):
+        with open(filename, "w") as theFile:
+            json.dump(self.ToDict(), theFile, indent=2, sort_keys=True)
+
+    def Print(self, file=sys.stdout):
+        stageTime = sum(stageStats.Time for stageStats in self.Stages.values())
+        file.write("%-10s %10s %6s %8s %12s\n" % ("Stage", "Time (ms)", "Share", "Files", "Bytes"))
+        for stage in STAGES:
+            stageStats = self.Stages[stage]
+            share = (100.0 * stageStats.Time / stageTime) if stageTime > 0 else 0.0
+            file.write("%-10s %10.2f %5.1f%% %8s %12s\n" % (stage, stageStats.Time * 1000.0, share, stageStats.Files, stageStats.Bytes))
+        file.write("%-10s %10.2f\n" % ("total", self.TotalTime * 1000.0))
+        file.write("Records: %s, unmatched: %s, written: %s, writes skipped: %s\n" % (self.Records, self.Unmatched, self.Written, self.WritesSkipped))
+
+
+class NullStats(Stats):
+    """
+    Stats that ignores everything, used when no stats are collected so the stages don't need to check for it.
+    """
+    IsEnabled = False
+
+    def Clock(self):
+        return 0
+
+    def AddStage(self, stage, startTime, fileCount=1, byteCount=0):
+        return 0
+
+    def AddRecords(self, recordCount, unmatchedCount):
+        pass
+
+    def AddWrite(self, written):
+        pass
+
+    def Stop(self):
+        pass
+
+
+g_nullStats = NullStats()
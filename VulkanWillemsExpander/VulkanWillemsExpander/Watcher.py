@@ -0,0 +1,195 @@
+#***************************************************************************************************************************************************
+#* BSD 3-Clause License
+#*
+#* Copyright (c) 2016, Rene Thrane
+#* All rights reserved.
+#* 
+#* Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#* 
+#* 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#* 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the 
+#*    documentation and/or other materials provided with the distribution.
+#* 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this 
+#*    software without specific prior written permission.
+#* 
+#* THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, 
+#* THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR 
+#* CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, 
+#* PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF 
+#* LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, 
+#* EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#***************************************************************************************************************************************************
+
+# File change detection for the watch mode.
+#
+# On linux the kernel inotify interface is used through ctypes so the process sleeps until something is written,
+# everywhere else (or when forced) the files are polled by comparing their size and modification time.
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from VulkanWillemsExpander import IOUtil
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0x00080000
+IN_NONBLOCK = 0x00000800
+
+INOTIFY_EVENT = struct.Struct("iIII")
+INOTIFY_WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+
+def TryLoadInotify():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class PollingWatcher(object):
+    def __init__(self, listFiles, pollInterval):
+        super(PollingWatcher, self).__init__()
+        self.ListFiles = listFiles
+        self.PollInterval = pollInterval
+        self.Snapshot = self.__TakeSnapshot()
+
+    def __TakeSnapshot(self):
+        snapshot = {}
+        for file in self.ListFiles():
+            try:
+                st = os.stat(file)
+            except OSError:
+                continue
+            snapshot[file] = (st.st_size, st.st_mtime_ns)
+        return snapshot
+
+    def WaitForChanges(self, timeout):
+        """
+        Wait for files to change, a empty set is returned if nothing changed before the timeout (None waits forever).
+        """
+        endTime = time.time() + timeout if timeout != None else None
+        while True:
+            sleepTime = self.PollInterval if endTime == None else max(0.0, min(self.PollInterval, endTime - time.time()))
+            time.sleep(sleepTime)
+            snapshot = self.__TakeSnapshot()
+            changes = set(file for file, fileStat in snapshot.items() if self.Snapshot.get(file) != fileStat)
+            self.Snapshot = snapshot
+            if len(changes) > 0 or (endTime != None and time.time() >= endTime):
+                return changes
+
+    def Close(self):
+        pass
+
+
+class InotifyWatcher(object):
+    def __init__(self, libc, rootDirectory, listFiles, excludedDirectories, isExcludedDirectory):
+        super(InotifyWatcher, self).__init__()
+        self.Libc = libc
+        self.ListFiles = listFiles
+        self.ExcludedDirectories = excludedDirectories
+        self.IsExcludedDirectory = isExcludedDirectory
+        self.WatchDirectories = {}
+        self.FileDescriptor = libc.inotify_init1(IN_CLOEXEC | IN_NONBLOCK)
+        if self.FileDescriptor < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        try:
+            self.__AddWatchRecursive(rootDirectory)
+        except:
+            self.Close()
+            raise
+
+    def __AddWatch(self, directory):
+        wd = self.Libc.inotify_add_watch(self.FileDescriptor, os.fsencode(directory), INOTIFY_WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_add_watch failed for '%s'" % (directory))
+        self.WatchDirectories[wd] = directory
+
+    def __AddWatchRecursive(self, directory):
+        for root, fileEntries in IOUtil.WalkTree(directory, self.ExcludedDirectories, self.IsExcludedDirectory):
+            self.__AddWatch(root)
+
+    def __IsExcluded(self, name, path):
+        if self.ExcludedDirectories != None and name in self.ExcludedDirectories:
+            return True
+        return self.IsExcludedDirectory != None and self.IsExcludedDirectory(path)
+
+    def WaitForChanges(self, timeout):
+        """
+        Wait for files to change, a empty set is returned if nothing changed before the timeout (None waits forever).
+        """
+        readable, writable, exceptional = select.select([self.FileDescriptor], [], [], timeout)
+        if len(readable) == 0:
+            return set()
+        changes = set()
+        try:
+            data = os.read(self.FileDescriptor, 256 * 1024)
+        except BlockingIOError:
+            return changes
+        offset = 0
+        while offset + INOTIFY_EVENT.size <= len(data):
+            wd, mask, cookie, nameLength = INOTIFY_EVENT.unpack_from(data, offset)
+            offset = offset + INOTIFY_EVENT.size
+            name = os.fsdecode(data[offset:offset + nameLength].rstrip(b"\0"))
+            offset = offset + nameLength
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost so report every file as changed
+                changes.update(self.ListFiles())
+                continue
+            directory = self.WatchDirectories.get(wd)
+            if directory == None or len(name) == 0:
+                continue
+            path = IOUtil.Join(directory, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and not self.__IsExcluded(name, path):
+                    self.__AddWatchRecursive(path)
+                    changes.update(file for file in self.ListFiles() if file.startswith(path + "/"))
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                changes.add(path)
+        return changes
+
+    def Close(self):
+        if self.FileDescriptor >= 0:
+            os.close(self.FileDescriptor)
+            self.FileDescriptor = -1
+
+
+def CreateWatcher(rootDirectory, listFiles, forcePolling, pollInterval, excludedDirectories=None, isExcludedDirectory=None):
+    """
+    The excluded directories are not watched by the inotify watcher, see IOUtil.WalkTree.
+    """
+    libc = TryLoadInotify() if not forcePolling else None
+    if libc != None:
+        try:
+            return InotifyWatcher(libc, rootDirectory, listFiles, excludedDirectories, isExcludedDirectory)
+        except OSError:
+            # Typically the watch limit was reached, fall back to polling
+            pass
+    return PollingWatcher(listFiles, pollInterval)
+
+
+def Watch(watcher, debounceTime, onChanges):
+    """
+    Call onChanges with the sorted list of changed files every time files change.
+    Bursts of changes are collected until nothing has changed for debounceTime seconds.
+    """
+    while True:
+        changes = watcher.WaitForChanges(None)
+        while True:
+            moreChanges = watcher.WaitForChanges(debounceTime)
+            if len(moreChanges) == 0:
+                break
+            changes.update(moreChanges)
+        if len(changes) > 0:
+            onChanges(sorted(changes))
@@ -0,0 +1,165 @@
+#***************************************************************************************************************************************************
+#* BSD 3-Clause License
+#*
+#* Copyright (c) 2016, Rene Thrane
+#* All rights reserved.
+#* 
+#* Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#* 
+#* 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#* 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the 
+#*    documentation and/or other materials provided with the distribution.
+#* 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this 
+#*    software without specific prior written permission.
+#* 
+#* THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, 
+#* THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR 
+#* CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, 
+#* PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF 
+#* LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, 
+#* EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#***************************************************************************************************************************************************
+
+# Benchmark of VulkanWillemsExpander.py using synthetic sources in the style of the Sascha Willems examples.
+#
+# For each requested size a source is generated that uses every method of g_allMethods in all use cases, the stages
+# of the expansion are then timed individually so it's possible to see how each of them scales with the file size.
+#
+# Example:
+#   VulkanWillemsExpanderBenchmark.py --sizes 1K,100K,10M --repeat 5 --json results.json
+
+import argparse
+import importlib.util
+import json
+import os
+import shutil
+import sys
+import tempfile
+from VulkanWillemsExpander.Benchmark import CorpusGenerator
+from VulkanWillemsExpander.Benchmark import StageBenchmark
+from VulkanWillemsExpander.Benchmark import UseCaseCheck
+
+DEFAULT_SIZES = "1K,10K,100K,1M,10M"
+
+
+def LoadTool():
+    """
+    Load VulkanWillemsExpander.py as a module, it can't be imported by name as the package next to it has the same name.
+    """
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "VulkanWillemsExpander.py")
+    spec = importlib.util.spec_from_file_location("VulkanWillemsExpanderTool", path)
+    tool = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(tool)
+    return tool
+
+
+def ParseSize(value):
+    value = value.strip().upper()
+    multipliers = {"K": 1024, "M": 1024 * 1024}
+    if len(value) > 0 and value[-1] in multipliers:
+        return int(float(value[:-1]) * multipliers[value[-1]])
+    return int(value)
+
+
+def FormatSize(size):
+    if size >= 1024 * 1024:
+        return "%.1fM" % (size / (1024.0 * 1024.0))
+    if size >= 1024:
+        return "%.1fK" % (size / 1024.0)
+    return "%s" % (size)
+
+
+def GetMethods(tool):
+    methods = []
+    for entry in tool.g_allMethods:
+        method = (entry.Name, entry.ParameterCount)
+        if not method in methods:
+            methods.append(method)
+    return methods
+
+
+def RunBenchmark(tool, args, outputDirectory):
+    methods = GetMethods(tool)
+    useCases = args.use_cases.split(",") if args.use_cases else CorpusGenerator.ALL_USE_CASES
+    replacementDict = tool.GetCodeReplacementDict()
+    results = []
+    print("%8s %8s %8s %10s %10s %10s %10s %10s %10s %8s" % ("size", "chars", "records", "scan", "lookup", "useCase", "patch", "write", "total", "MB/s"))
+    for sizeString in args.sizes.split(","):
+        targetSize = ParseSize(sizeString)
+        source = CorpusGenerator.GenerateSource(methods, targetSize, args.seed, useCases, args.calls_per_use_case, args.filler_lines)
+        targetFileName = os.path.join(outputDirectory, "benchmark_%s%s.cpp" % (sizeString.strip(), tool.MAGIC_TAG))
+        if args.keep:
+            tool.IOUtil.WriteFile(os.path.join(outputDirectory, "benchmark_%s.cpp" % (sizeString.strip())), source)
+
+        timingsList = []
+        for i in range(max(1, args.repeat)):
+            timings, expandedSource = StageBenchmark.TimeStages(tool, source, replacementDict, targetFileName)
+            timingsList.append(timings)
+        best = StageBenchmark.GetBestTimings(timingsList)
+
+        total = best.GetTotal()
+        throughput = (len(source) / (1024.0 * 1024.0)) / total if total > 0 else 0.0
+        print("%8s %8s %8s %10.4f %10.4f %10.4f %10.4f %10.4f %10.4f %8.2f" % (sizeString.strip(), FormatSize(len(source)), best.RecordCount,
+              best.Times["scan"], best.Times["lookup"], best.Times["useCase"], best.Times["patch"], best.Times["write"], total, throughput))
+        results.append({"size": sizeString.strip(), "chars": len(source), "records": best.RecordCount, "stages": best.Times, "total": total})
+    return results
+
+
+def CheckUseCases(tool, args):
+    """
+    Compare the use cases of the generated sources and the given files to the reference classification.
+    Returns the number of sources with mismatches.
+    """
+    methods = GetMethods(tool)
+    useCases = args.use_cases.split(",") if args.use_cases else CorpusGenerator.ALL_USE_CASES
+    sources = []
+    for sizeString in args.sizes.split(","):
+        sources.append(("generated %s" % (sizeString.strip()), CorpusGenerator.GenerateSource(methods, ParseSize(sizeString), args.seed, useCases, args.calls_per_use_case, args.filler_lines)))
+    for filename in args.check_use_cases:
+        sources.append((filename, tool.IOUtil.ReadFile(filename)))
+
+    failedCount = 0
+    for name, source in sources:
+        mismatches = UseCaseCheck.FindMismatches(tool, source)
+        for startIndex, expected, actual in mismatches[:10]:
+            print("  %s: index %s expected %s got %s" % (name, startIndex, tool.ToUseCaseString(expected), tool.ToUseCaseString(actual)))
+        print("%s: %s mismatches" % (name, len(mismatches)))
+        if len(mismatches) > 0:
+            failedCount = failedCount + 1
+    return failedCount
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the stages of VulkanWillemsExpander on generated sources.')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help="Comma separated list of source sizes to generate, K and M suffixes are supported (default: %s)" % (DEFAULT_SIZES))
+    parser.add_argument('--repeat', type=int, default=3, help="Run each size this many times and report the fastest time of each stage")
+    parser.add_argument('--seed', type=int, default=0, help="Seed used by the source generator")
+    parser.add_argument('--use-cases', default=None, help="Comma separated list of the use cases to generate (default: %s)" % (",".join(CorpusGenerator.ALL_USE_CASES)))
+    parser.add_argument('--calls-per-use-case', type=int, default=1, help="The number of consecutive calls generated for each method and use case")
+    parser.add_argument('--filler-lines', type=int, default=2, help="The number of filler lines generated after each call")
+    parser.add_argument('--json', default=None, help="Write the results to this json file")
+    parser.add_argument('--keep', default=None, help="Keep the generated and expanded sources in this directory")
+    parser.add_argument('--vectorized-scan', action='store_true', help="Benchmark the tool with --vectorized-scan")
+    parser.add_argument('--check-use-cases', metavar='FILE', nargs='*', default=None, help="Compare the use cases of the generated sources and these files to the original backwards classification instead of timing them")
+    args = parser.parse_args()
+
+    tool = LoadTool()
+    tool.g_useVectorizedScan = args.vectorized_scan
+    if args.check_use_cases != None:
+        sys.exit(1 if CheckUseCases(tool, args) > 0 else 0)
+    outputDirectory = args.keep if args.keep else tempfile.mkdtemp(prefix="VulkanWillemsExpanderBenchmark")
+    try:
+        if args.keep:
+            tool.IOUtil.SafeMakeDirs(outputDirectory)
+        results = RunBenchmark(tool, args, outputDirectory)
+    finally:
+        if not args.keep:
+            shutil.rmtree(outputDirectory, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w") as theFile:
+            json.dump({"title": tool.GetTitle(), "results": results}, theFile, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#***************************************************************************************************************************************************
+#* BSD 3-Clause License
+#*
+#* Copyright (c) 2016, Rene Thrane
+#* All rights reserved.
+#* 
+#* Redistribution and use in source and binary forms, with or without modification, are permitted provided that the following conditions are met:
+#* 
+#* 1. Redistributions of source code must retain the above copyright notice, this list of conditions and the following disclaimer.
+#* 2. Redistributions in binary form must reproduce the above copyright notice, this list of conditions and the following disclaimer in the 
+#*    documentation and/or other materials provided with the distribution.
+#* 3. Neither the name of the copyright holder nor the names of its contributors may be used to endorse or promote products derived from this 
+#*    software without specific prior written permission.
+#* 
+#* THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, 
+#* THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR 
+#* CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, 
+#* PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF 
+#* LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, 
+#* EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#***************************************************************************************************************************************************
+
+# Thin client for a VulkanWillemsExpander started with --daemon.
+# It only forwards the request, so the per request cost is the expansion itself instead of the full tool startup.
+#
+# Examples:
+#   VulkanWillemsExpanderClient.py /tmp/vwe.sock - < triangle.cpp > triangle_expanded.cpp
+#   VulkanWillemsExpanderClient.py /tmp/vwe.sock triangle.cpp --overwrite
+#   VulkanWillemsExpanderClient.py /tmp/vwe.sock --shutdown
+
+import argparse
+import os
+import sys
+from VulkanWillemsExpander import Daemon
+
+STREAM_NAME = "-"
+
+
+def Run(args):
+    client = Daemon.DaemonClient(args.socket)
+    try:
+        if args.shutdown:
+            client.Request({"command": "shutdown"})
+            return
+        if not args.inputFile:
+            return
+
+        if args.inputFile == STREAM_NAME or args.outputFile == STREAM_NAME:
+            if args.inputFile == STREAM_NAME:
+                source = sys.stdin.read()
+            else:
+                with open(args.inputFile, "r") as theFile:
+                    source = theFile.read()
+            response = client.Request({"command": "expand", "source": source})
+            for warning in response["warnings"]:
+                sys.stderr.write("%s\n" % warning)
+            if not args.outputFile or args.outputFile == STREAM_NAME:
+                sys.stdout.write(response["source"])
+                sys.stdout.flush()
+            else:
+                with open(args.outputFile, "w") as theFile:
+                    theFile.write(response["source"])
+        else:
+            # Let the daemon do the file I/O, so it gets the exact same behavior as the tool itself
+            request = {"command": "expandFile", "file": os.path.abspath(args.inputFile), "overwrite": args.overwrite}
+            if args.outputFile:
+                request["target"] = os.path.abspath(args.outputFile)
+            response = client.Request(request)
+            for warning in response["warnings"]:
+                print(warning)
+    finally:
+        client.Close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Send expansion requests to a running VulkanWillemsExpander daemon.')
+    parser.add_argument('--debug', action='store_true',  help='Enable script debugging')
+    parser.add_argument("socket", help="the unix socket the daemon is listening on")
+    parser.add_argument("inputFile",  nargs='?', help="the name of the input file, '-' reads the source from stdin")
+    parser.add_argument("outputFile", nargs='?', default=None, help="the name of the output file, '-' writes the result to stdout (the default if the input is '-')")
+    parser.add_argument('--overwrite', action='store_true',  help="Overwrite the input file, this only works if no outputFile is specified")
+    parser.add_argument('--shutdown', action='store_true',  help="Ask the daemon to shut down")
+    args = parser.parse_args()
+    try:
+        Run(args)
+    except (Exception) as ex:
+        sys.stderr.write("ERROR: %s\n" % (ex))
+        if args.debug:
+            raise
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()